@@ -0,0 +1,17 @@
+from sys import argv, exit
+
+from benchmarks import scenarios, micro
+
+#: ``{name: module}`` for each benchmark suite; each has a ``main`` function
+#: taking command-line arguments.
+SUITES = {
+    'scenarios': scenarios,
+    'micro': micro
+}
+
+if __name__ == '__main__':
+    if len(argv) < 2 or argv[1] not in SUITES:
+        print 'usage: bench {{{0}}} [options]'.format('|'.join(sorted(SUITES)))
+        print 'pass --help after the suite name for its options'
+        exit(2)
+    SUITES[argv[1]].main(argv[2:])
@@ -0,0 +1,53 @@
+"""Performance benchmarks.
+
+Run these through ``bench.py`` in the top-level directory, so that data files
+are found.  Everything runs headlessly (see :data:`engine.conf.HEADLESS`).
+
+"""
+
+import json
+from timeit import default_timer as time
+
+from game import engine
+
+__all__ = ('time', 'init', 'percentile', 'summarise', 'write_json')
+
+
+def init ():
+    """Initialise the engine for running without a display."""
+    engine.conf.HEADLESS = True
+    engine.init()
+
+
+def percentile (xs, p):
+    """Return the ``p``th percentile (``0 <= p <= 100``) of a sorted list."""
+    if not xs:
+        return 0
+    # nearest-rank
+    i = int(round(p / 100. * (len(xs) - 1)))
+    return xs[i]
+
+
+def summarise (times):
+    """Summarise a list of durations in seconds.
+
+summarise(times) -> stats
+
+:return: ``{stat: milliseconds}`` dict containing ``'median'``, ``'p95'``,
+         ``'p99'``, ``'mean'`` and ``'max'``.
+
+"""
+    xs = sorted(1000 * t for t in times)
+    return {
+        'median': percentile(xs, 50),
+        'p95': percentile(xs, 95),
+        'p99': percentile(xs, 99),
+        'mean': sum(xs) / len(xs) if xs else 0,
+        'max': xs[-1] if xs else 0
+    }
+
+
+def write_json (fn, data):
+    """Write results to a file as JSON."""
+    with open(fn, 'w') as f:
+        json.dump(data, f, indent = 4, sort_keys = True)
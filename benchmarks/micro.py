@@ -0,0 +1,270 @@
+"""Microbenchmarks for engine primitives.
+
+Each benchmark times one engine operation in isolation, over a range of input
+sizes.  Results can be saved as a baseline and later runs compared against it
+to catch slowdowns.
+
+"""
+
+import sys
+import json
+import random
+from math import pi
+from optparse import OptionParser
+
+import numpy as np
+import pygame as pg
+
+from game import engine
+from game.engine import game as engine_game, gm, sched, eh, mltr, _gm
+from benchmarks import time, init, write_json
+
+conf = engine.conf
+
+
+def _rand_rects (n, size = 100):
+    """Generate ``n`` random rects on the screen, each at most ``size`` wide."""
+    w, h = conf.RES
+    rects = []
+    for i in xrange(n):
+        rw = random.randint(1, size)
+        rh = random.randint(1, size)
+        rects.append(pg.Rect(random.randrange(w - rw), random.randrange(h - rh),
+                             rw, rh))
+    return rects
+
+
+def _sfc (size, alpha = False):
+    sfc = pg.Surface(size)
+    if alpha:
+        sfc = sfc.convert_alpha()
+        sfc.fill((100, 150, 200, 100))
+    else:
+        sfc = sfc.convert()
+        sfc.fill((100, 150, 200))
+    return sfc
+
+
+def bench_fastdraw (n):
+    """Draw 50 graphics over ``n`` random dirty rects with ``_gm.fastdraw``."""
+    manager = gm.GraphicsManager(sched.Scheduler(), conf.GAME.screen)
+    for rect in _rand_rects(50, 200):
+        manager.add(gm.Graphic(_sfc(rect.size, random.randrange(2)),
+                               rect.topleft, random.randrange(5)))
+    # draw once so that graphics are no longer dirty
+    manager.draw()
+    rects = _rand_rects(n)
+    layers = manager.layers
+    sfc = manager.surface
+    graphics = manager.graphics
+    return lambda: _gm.fastdraw(layers, sfc, graphics, list(rects))
+
+
+def bench_mk_disjoint (n):
+    """Make ``n`` random rects disjoint, excluding ``n / 4`` others."""
+    add = _rand_rects(n)
+    rm = _rand_rects(n / 4)
+    return lambda: _gm.mk_disjoint(add, rm)
+
+
+def bench_gm_add_rm (n):
+    """Add ``n`` graphics to a manager, then remove them all."""
+    manager = gm.GraphicsManager(sched.Scheduler(), conf.GAME.screen)
+    sfc = _sfc((10, 10))
+    graphics = [gm.Graphic(sfc, (0, 0), i % 10) for i in xrange(n)]
+
+    def f ():
+        manager.add(*graphics)
+        manager.rm(*graphics)
+
+    return f
+
+
+def bench_transform (size):
+    """Apply and change a resize/rotate/crop/flip chain on a graphic."""
+    g = gm.Graphic(_sfc((size, size), True))
+    state = [False]
+
+    def f ():
+        flip = state[0] = not state[0]
+        g.resize(size * (2 - flip), size)
+        g.rotate(pi / (4 + flip))
+        g.crop((flip, flip, size, size))
+        g.flip(flip, True)
+
+    return f
+
+
+def bench_sched_update (n):
+    """Run one frame of a scheduler with ``n`` timeouts, 1% of them due."""
+    s = sched.Scheduler()
+    cb = lambda: True
+    for i in xrange(n):
+        if i % 100 == 0:
+            s.add_timeout(cb, frames = 1)
+        else:
+            s.add_timeout(cb, seconds = 10 ** 6)
+    return s._update
+
+
+def bench_eh_update (n):
+    """Handle 20 key events with ``n`` registered key handlers."""
+    cb = lambda *args: None
+    key_handlers = []
+    for i in xrange(n):
+        keys = [(pg.K_a + i % 26, pg.KMOD_SHIFT * (i / 26 % 2), False)]
+        mode = i % 5
+        if mode in (eh.MODE_ONPRESS_REPEAT, eh.MODE_ONDOWN_REPEAT):
+            key_handlers.append((keys, cb, mode, 10, 5))
+        else:
+            key_handlers.append((keys, cb, mode))
+    handler = eh.EventHandler(key_handlers = key_handlers)
+    evts = [pg.event.Event(t, key = pg.K_a + i, mod = 0, unicode = u'')
+            for i in xrange(10) for t in (pg.KEYDOWN, pg.KEYUP)]
+
+    def f ():
+        for evt in evts:
+            pg.event.post(evt)
+        handler.update()
+
+    return f
+
+
+def bench_fonts_render (n):
+    """Render ``n`` words of text wrapped to 300 pixels."""
+    fonts = mltr.Fonts(conf.FONT_DIR)
+    fonts['main'] = ('DenkOne-Regular.ttf', 20)
+    words = ('lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur')
+    text = ' '.join(random.choice(words) for i in xrange(n))
+    return lambda: fonts.render('main', text, (0, 0, 0), width = 300,
+                                just = 1)
+
+
+#: ``(name, function, args)`` for each benchmark, where ``function`` is called
+#: with each item of ``args`` and returns the function to time.
+BENCHMARKS = (
+    ('fastdraw', bench_fastdraw, (10, 50, 200, 1000)),
+    ('mk_disjoint', bench_mk_disjoint, (10, 50, 200, 1000)),
+    ('gm_add_rm', bench_gm_add_rm, (100, 1000, 5000)),
+    ('transform', bench_transform, (16, 64, 256)),
+    ('sched_update', bench_sched_update, (1000, 10000)),
+    ('eh_update', bench_eh_update, (10, 100, 1000)),
+    ('fonts_render', bench_fonts_render, (10, 100, 500))
+)
+
+
+def measure (f, min_time = .2, repeat = 5):
+    """Time a function.
+
+measure(f, min_time = .2, repeat = 5) -> seconds
+
+:arg f: function to call without arguments.
+:arg min_time: each timing run calls ``f`` enough times to take at least this
+               many seconds.
+:arg repeat: number of timing runs.
+
+:return: the lowest average time taken per call over the timing runs.
+
+"""
+    # find how many calls we need for each run
+    number = 1
+    while 1:
+        t0 = time()
+        for i in xrange(number):
+            f()
+        t = time() - t0
+        if t >= min_time:
+            break
+        number *= 2 if t <= 0 else max(2, int(min_time / t) + 1)
+    best = t / number
+    for i in xrange(repeat - 1):
+        t0 = time()
+        for i in xrange(number):
+            f()
+        best = min(best, (time() - t0) / number)
+    return best
+
+
+def compare (results, baseline, threshold):
+    """Compare results against a baseline.
+
+compare(results, baseline, threshold) -> slower
+
+:arg results: ``{name: seconds}`` dict.
+:arg baseline: ``{name: seconds}`` dict; names missing from either are ignored.
+:arg threshold: ratio by which a result may be slower than the baseline before
+                it's flagged.
+
+:return: list of ``(name, ratio)`` for flagged results, where ``ratio`` is the
+         proportion by which the result is slower than the baseline.
+
+"""
+    slower = []
+    for name, t in sorted(results.iteritems()):
+        t0 = baseline.get(name)
+        if t0:
+            ratio = t / t0 - 1
+            if ratio > threshold:
+                slower.append((name, ratio))
+    return slower
+
+
+def main (args):
+    """Run microbenchmarks from the command line."""
+    op = OptionParser(prog = 'bench micro')
+    op.add_option('-k', '--bench', action = 'append', dest = 'benches',
+                  help = 'benchmark to run (may be given more than once); ' \
+                  'defaults to all of: ' + \
+                  ', '.join(name for name, f, ns in BENCHMARKS))
+    op.add_option('-b', '--baseline', action = 'store', type = 'string',
+                  help = 'JSON results file to compare against')
+    op.add_option('-t', '--threshold', action = 'store', type = 'float',
+                  help = 'flag results slower than the baseline by more ' \
+                  'than this ratio; defaults to 0.1')
+    op.add_option('-o', '--output', action = 'store', type = 'string',
+                  help = 'file to write JSON results to (can be used as a ' \
+                  'baseline later)')
+    op.add_option('-e', '--seed', action = 'store', type = 'int',
+                  help = 'seed for random number generation; defaults to 0')
+    op.add_option('-m', '--min-time', action = 'store', type = 'float',
+                  help = 'minimum number of seconds for each timing run; ' \
+                  'defaults to 0.2')
+    op.set_defaults(benches = None, baseline = None, threshold = .1,
+                    output = None, seed = 0, min_time = .2)
+    options = op.parse_args(args)[0]
+    benches = BENCHMARKS
+    if options.benches is not None:
+        names = set(name for name, f, ns in BENCHMARKS)
+        unknown = set(options.benches) - names
+        if unknown:
+            op.error('unknown benchmarks: ' + ', '.join(sorted(unknown)))
+        benches = [b for b in BENCHMARKS if b[0] in options.benches]
+    baseline = {}
+    if options.baseline is not None:
+        with open(options.baseline) as f:
+            baseline = json.load(f)['results']
+
+    init()
+    engine_game.Game(engine_game.World)
+    results = {}
+    for name, setup, ns in benches:
+        for n in ns:
+            random.seed(options.seed)
+            np.random.seed(options.seed)
+            key = '{0}/{1}'.format(name, n)
+            t = results[key] = measure(setup(n), options.min_time)
+            line = '{0:<20} {1:>12.3f} us'.format(key, 10 ** 6 * t)
+            if baseline.get(key):
+                line += ' ({0:+.1%})'.format(t / baseline[key] - 1)
+            print line
+    engine.quit()
+    if options.output is not None:
+        write_json(options.output, {'seed': options.seed, 'results': results})
+    slower = compare(results, baseline, options.threshold)
+    if slower:
+        print 'slower than baseline by more than {0:.0%}:'.format(
+            options.threshold
+        )
+        for name, ratio in slower:
+            print '    {0}: {1:+.1%}'.format(name, ratio)
+        sys.exit(1)
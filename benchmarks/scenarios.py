@@ -0,0 +1,251 @@
+"""Whole-game scenario benchmarks.
+
+Each scenario creates a :class:`game.level.Level` world and runs it for a
+number of frames while scripting some activity, recording how long each phase
+of each frame takes (see :class:`engine.perf.FrameStats`): the world's
+``update`` and ``draw`` methods and ``pygame.display.update`` are the main
+ones.
+
+"""
+
+import random
+from optparse import OptionParser
+
+import numpy as np
+
+from game import engine
+from game.engine import game as engine_game, perf
+from game.level import Level, Painter
+from benchmarks import init, summarise, write_json
+
+conf = engine.conf
+
+#: Frame phases recorded, in order; ``'frame'`` is the whole frame.
+PHASES = perf.PHASES[:perf.SLEEP] + ('frame',)
+
+
+class Scenario (object):
+    """A scripted run of a :class:`game.level.Level` world.
+
+Scenario(name, frames = 600, conf = {})
+
+:arg name: identifier for results.
+:arg frames: default number of frames to run for.
+:arg conf: settings to override in :data:`engine.conf` while running.
+
+Subclasses override :meth:`setup` and :meth:`step`.
+
+"""
+
+    def __init__ (self, name, frames = 600, conf = {}):
+        self.name = name
+        self.frames = frames
+        self.conf = conf
+
+    def setup (self, world):
+        """Called with the new world before the first frame."""
+        pass
+
+    def step (self, world, frame):
+        """Called before each frame with the current world and frame number."""
+        pass
+
+
+class Painters (Scenario):
+    """Keep a number of painters in flight.
+
+Painters(name, n, spawn_rate = None, frames = 600, conf = {})
+
+:arg n: number of painters to keep alive.
+:arg spawn_rate: maximum number of painters to fire in one frame; defaults to
+                 ``n / 20``.
+
+Painters are only fired in lanes which leave the bottom-right tile of the
+canvas unpainted, so the game never ends.
+
+"""
+
+    def __init__ (self, name, n, spawn_rate = None, *args, **kwargs):
+        Scenario.__init__(self, name, *args, **kwargs)
+        self.n = n
+        if spawn_rate is None:
+            spawn_rate = max(n / 20, 1)
+        self.spawn_rate = spawn_rate
+
+    def step (self, world, frame):
+        if not isinstance(world, Level):
+            return
+        w, h = world.rect.size
+        for i in xrange(min(self.n - len(world.painters), self.spawn_rate)):
+            axis = random.randrange(2)
+            pos = [0, 0]
+            # not the last row or column of the canvas
+            pos[not axis] = random.randrange(1, (h, w)[not axis] - 2)
+            Painter(world, random.randrange(2), pos, axis, 1,
+                    random.uniform(0, 1.6), world.painter_imgs)
+
+
+class Bursts (Scenario):
+    """Create particle bursts at random positions.
+
+Bursts(name, n = 2, period = 15, frames = 600, conf = {})
+
+:arg n: number of bursts to create at once.
+:arg period: number of frames between bursts.
+
+"""
+
+    def __init__ (self, name, n = 2, period = 15, *args, **kwargs):
+        Scenario.__init__(self, name, *args, **kwargs)
+        self.n = n
+        self.period = period
+
+    def step (self, world, frame):
+        if frame % self.period == 0:
+            r = world.canvas.rect
+            for i in xrange(self.n):
+                pos = (random.randrange(r.left, r.right),
+                       random.randrange(r.top, r.bottom))
+                vel = (random.uniform(-100, 100), random.uniform(-100, 100))
+                world.add_ptcls(pos, random.randrange(2), vel)
+
+
+class FullCanvas (Painters):
+    """Paint all but the bottom-right tile, then keep painters in flight.
+
+Takes the same arguments as :class:`Painters`.
+
+"""
+
+    def setup (self, world):
+        paint_all(world, True)
+
+
+class EndGame (Scenario):
+    """Paint all but one tile, then paint the last to end the game.
+
+EndGame(name, end_frame = 30, frames = 600, conf = {})
+
+:arg end_frame: the frame to paint the last tile on; the rest of the frames
+                are spent in the post-game world.
+
+"""
+
+    def __init__ (self, name, end_frame = 30, *args, **kwargs):
+        Scenario.__init__(self, name, *args, **kwargs)
+        self.end_frame = end_frame
+
+    def setup (self, world):
+        paint_all(world, True)
+
+    def step (self, world, frame):
+        if frame == self.end_frame:
+            x, y, w, h = world.canvas.trect
+            world.canvas.paint(0, x + w - 1, y + h - 1)
+
+
+def paint_all (world, leave_last = False):
+    """Paint every canvas tile in alternating colours.
+
+paint_all(world, leave_last = False)
+
+:arg leave_last: don't paint the bottom-right tile, so the game doesn't end.
+
+"""
+    x0, y0, w, h = world.canvas.trect
+    for x in xrange(x0, x0 + w):
+        for y in xrange(y0, y0 + h):
+            if not leave_last or (x, y) != (x0 + w - 1, y0 + h - 1):
+                world.canvas.paint((x + y) % 2, x, y)
+
+
+#: Scenarios run by default, in order.
+SCENARIOS = (
+    Scenario('idle'),
+    Painters('painters20', 20),
+    Painters('painters100', 100),
+    Painters('painters500', 500, conf = {'LEVEL_SIZE': (61 + 2, 29 + 2)}),
+    Bursts('bursts'),
+    FullCanvas('full_canvas', 20),
+    EndGame('end_game')
+)
+
+
+def run_scenario (scenario, frames = None):
+    """Run a scenario.
+
+run_scenario(scenario[, frames]) -> results
+
+:arg scenario: :class:`Scenario` instance.
+:arg frames: number of frames to run for; defaults to the scenario's default.
+
+:return: ``{phase: stats}`` dict for each of :data:`PHASES`, where ``stats``
+         is as returned by :func:`benchmarks.summarise`, with an extra
+         ``'frames'`` key giving the number of frames run.
+
+"""
+    if frames is None:
+        frames = scenario.frames
+    for k, v in scenario.conf.iteritems():
+        setattr(conf, k, v)
+    try:
+        game = engine_game.Game(Level)
+        stats = game.frame_stats = perf.FrameStats(frames)
+        stats.enabled = True
+        scenario.setup(game.world)
+        for frame in xrange(frames):
+            world = game.world
+            scenario.step(world, frame)
+            world.scheduler.run(frames = 1)
+        stats.finish()
+    finally:
+        for k in scenario.conf:
+            delattr(conf, k)
+    # sleep is always 0 when headless
+    times = [ts[:perf.SLEEP] + [sum(ts[:perf.SLEEP])] for ts in stats.frames]
+    results = dict((phase, summarise(ts))
+                   for phase, ts in zip(PHASES, zip(*times)))
+    results['frames'] = frames
+    return results
+
+
+def main (args):
+    """Run scenarios from the command line."""
+    op = OptionParser(prog = 'bench scenarios')
+    op.add_option('-s', '--scenario', action = 'append', dest = 'scenarios',
+                  help = 'scenario to run (may be given more than once); ' \
+                  'defaults to all of: ' + \
+                  ', '.join(s.name for s in SCENARIOS))
+    op.add_option('-r', '--frames', action = 'store', type = 'int',
+                  help = 'number of frames to run each scenario for')
+    op.add_option('-e', '--seed', action = 'store', type = 'int',
+                  help = 'seed for random number generation; defaults to 0')
+    op.add_option('-o', '--output', action = 'store', type = 'string',
+                  help = 'file to write JSON results to; defaults to ' \
+                  '\'scenarios.json\'')
+    op.set_defaults(scenarios = None, frames = None, seed = 0,
+                    output = 'scenarios.json')
+    options = op.parse_args(args)[0]
+    scenarios = SCENARIOS
+    if options.scenarios is not None:
+        by_name = dict((s.name, s) for s in SCENARIOS)
+        unknown = set(options.scenarios) - set(by_name)
+        if unknown:
+            op.error('unknown scenarios: ' + ', '.join(sorted(unknown)))
+        scenarios = [by_name[name] for name in options.scenarios]
+
+    init()
+    results = {}
+    for scenario in scenarios:
+        random.seed(options.seed)
+        np.random.seed(options.seed)
+        r = results[scenario.name] = run_scenario(scenario, options.frames)
+        print '{0:<12} {1:>5} frames; ms median/p95/p99: '.format(
+            scenario.name, r['frames']
+        ) + '; '.join(
+            '{0} {1[median]:.2f}/{1[p95]:.2f}/{1[p99]:.2f}'.format(phase,
+                                                                   r[phase])
+            for phase in PHASES
+        )
+    write_json(options.output, {'seed': options.seed, 'scenarios': results})
+    engine.quit()
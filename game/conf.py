@@ -9,6 +9,12 @@ class Conf (object):
     WINDOW_TITLE = 'It\'s Probably Not Even Paint'
     WINDOW_ICON = conf.IMG_DIR + 'icon.png'
 
+    # timing (used if engine.conf.FPS_GOVERNOR is set): the level keeps to
+    # its FPS unless overloaded, and the post-game screen drops its FPS while
+    # nothing changes
+    FPS_RANGE = dd(None, level = (30, 60), postgame = (20, 60))
+    FPS_LOWER_WHEN_INACTIVE = dd(False, postgame = True)
+
     # input
     KEYS_MOVE = (
         ((pg.K_a, pg.K_q), (pg.K_w, pg.K_z, pg.K_COMMA), (pg.K_d, pg.K_e),
@@ -30,6 +36,11 @@ class Conf (object):
     PLAYER_MOVE_DELAY = 3 # as ratio of normal delay
     POSTGAME_INPUT_DELAY = 1.5
 
+    # performance
+    BATCH_PAINT = True # draw painted tiles once per frame rather than each time
+    # track the level's dirty areas in a grid of tiles rather than as rects
+    DIRTY_GRID = True
+
     # graphics
     RES_W = (1024, 576)
     PLAYER_COLOURS = ((228, 75, 36), (144, 87, 197))
@@ -49,6 +60,14 @@ class Conf (object):
     )
     BURST_PARTICLES = (2000, (2.5, 1), (30, 20), (-3, 2), (1, .4))
     PARTICLE_FADE_TIME = .2 # proportion of life
+    PARTICLE_POOL_SIZE = 8192 # initial pixels allocated for all bursts
+    # pixels of particles allowed at once across all bursts: (min, max); the
+    # limit is reduced when frames take too long, and bursts are scaled down
+    PARTICLE_BUDGET = (2000, 20000)
+    # proportion of the frame spent working (not waiting) below which the
+    # limit grows and above which it shrinks
+    PARTICLE_LOAD = (.6, .85)
+    PARTICLE_BUDGET_STEP = (1.05, 1.5) # (growth, shrink) factor per frame
     METER_WIDTH = 10
     SCORE_HEIGHT = 20
     MARGIN = 5
@@ -58,6 +77,8 @@ class Conf (object):
     MOVE_SOUND_FREQ = (.5, .2)
     SOUND_VOLUME = .5
     SOUND_VOLUMES = dd(1, move = .5, p1point = .2, p2point = .2, explode = 2)
+    SOUND_MAX_PER_FRAME = dd(1, explode = 2)
+    SOUND_MIN_INTERVAL = dd(0, p1point = .05, p2point = .05)
 
 
 conf.add(Conf.__dict__)
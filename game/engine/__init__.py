@@ -1,6 +1,8 @@
+import os
+
 import pygame as pg
 
-import game, sched, eh, gm, mltr, util, settings
+import game, sched, eh, gm, mltr, util, settings, audio, perf
 from conf import conf
 
 pg.mixer.pre_init(buffer = 1024)
@@ -8,6 +10,10 @@ pg.mixer.pre_init(buffer = 1024)
 
 def init ():
     """Initialise the game engine."""
+    if conf.HEADLESS:
+        # SDL's dummy drivers need no display or sound card
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
     pg.init()
     if conf.WINDOW_ICON is not None:
         pg.display.set_icon(pg.image.load(conf.WINDOW_ICON))
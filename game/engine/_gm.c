@@ -1,63 +1,215 @@
 #include <Python.h>
 #include <pygame/pygame.h>
 
-#define MAX_QSORT_LEVELS 300
+// region states for disjoint_rects
+#define S_NONE 0
+#define S_ALL 1
+#define S_MIXED 2
 
-void quicksort(int *arr, int elements) {
-    // http://alienryderflex.com/quicksort/
-    int piv, beg[MAX_QSORT_LEVELS], end[MAX_QSORT_LEVELS], i = 0, L, R, swap;
-    beg[0] = 0;
-    end[0] = elements;
-    while (i >= 0) {
-        L = beg[i];
-        R = end[i] - 1;
-        if (L < R) {
-            piv = arr[L];
-            while (L < R) {
-                while (arr[R] >= piv && L < R) R--;
-                if (L < R) arr[L++] = arr[R];
-                while (arr[L] <= piv && L < R) L++;
-                if (L < R) arr[R--] = arr[L];
-            }
-            arr[L] = piv;
-            beg[i + 1] = L + 1;
-            end[i + 1] = end[i];
-            end[i++] = L;
-            if (end[i] - beg[i] > end[i - 1] - beg[i - 1]) {
-                swap = beg[i];
-                beg[i] = beg[i - 1];
-                beg[i - 1] = swap;
-                swap = end[i];
-                end[i] = end[i - 1];
-                end[i - 1] = swap;
-            }
-        } else i--;
+typedef struct {
+    // a horizontal edge of a rect: where it starts or stops covering
+    int y, x0, x1; // x0, x1 index into the sorted x edges
+    int rm, delta; // whether from an rm rect; +1 at the top, -1 at the bottom
+} HEdge;
+
+typedef struct {
+    // segment tree node covering a range of x edges
+    int n_add, n_rm; // rects covering the whole range, not counted by parents
+    char rm, on; // rm coverage within the range; add and not rm coverage
+} Node;
+
+typedef struct {
+    // growable list of ints
+    int* data;
+    int n, size;
+} IntList;
+
+int cmp_int (const void* a, const void* b) {
+    int x = *(const int*) a, y = *(const int*) b;
+    return (x > y) - (x < y);
+}
+
+int cmp_hedge (const void* a, const void* b) {
+    int y0 = ((const HEdge*) a)->y, y1 = ((const HEdge*) b)->y;
+    return (y0 > y1) - (y0 < y1);
+}
+
+int index_of (int* arr, int n, int x) {
+    // binary search in a sorted array that contains x
+    int lo = 0, hi = n - 1, mid;
+    while (lo < hi) {
+        mid = (lo + hi) / 2;
+        if (arr[mid] < x) lo = mid + 1;
+        else hi = mid;
     }
+    return lo;
 }
 
-int find (int *arr, int n, int x, int i) {
-    for (; i < n; i++) {
-        if (arr[i] == x) return i;
+void list_add (IntList* l, int x) {
+    if (l->n == l->size) {
+        l->size = l->size ? 2 * l->size : 64;
+        PyMem_Resize(l->data, int, l->size);
     }
-    return -1;
+    l->data[l->n++] = x;
+}
+
+char combine (char a, char b) {
+    return a == b ? a : S_MIXED;
 }
 
-int set_add (int *arr, int n, int x) {
+char invert (char s) {
+    return s == S_MIXED ? S_MIXED : !s;
+}
+
+void tree_sum (Node* tree, int node, int leaf) {
+    // recompute a node's states from its counts and children
+    Node* t = tree + node;
+    if (t->n_rm > 0) {
+        t->rm = S_ALL;
+        t->on = S_NONE;
+        return;
+    }
+    if (leaf) {
+        t->rm = S_NONE;
+        t->on = t->n_add > 0 ? S_ALL : S_NONE;
+        return;
+    }
+    t->rm = combine(tree[2 * node].rm, tree[2 * node + 1].rm);
+    if (t->n_add > 0) t->on = invert(t->rm);
+    else t->on = combine(tree[2 * node].on, tree[2 * node + 1].on);
+}
+
+void tree_update (Node* tree, int node, int lo, int hi, HEdge* e) {
+    // apply an edge to the node covering x edges [lo, hi)
+    int mid;
+    if (e->x0 <= lo && hi <= e->x1) {
+        if (e->rm) tree[node].n_rm += e->delta;
+        else tree[node].n_add += e->delta;
+    } else {
+        mid = (lo + hi) / 2;
+        if (e->x0 < mid) tree_update(tree, 2 * node, lo, mid, e);
+        if (e->x1 > mid) tree_update(tree, 2 * node + 1, mid, hi, e);
+    }
+    tree_sum(tree, node, hi - lo == 1);
+}
+
+void tree_runs (Node* tree, int node, int lo, int hi, int added,
+                int* xs, IntList* runs) {
+    // append [x0, x1) for covered x ranges, merging adjacent ones
+    Node* t = tree + node;
+    char state;
+    int mid;
+    if (t->n_rm > 0) return;
+    state = added ? invert(t->rm) : t->on;
+    if (state == S_NONE) return;
+    if (state == S_ALL) {
+        if (runs->n && runs->data[runs->n - 1] == xs[lo])
+            runs->data[runs->n - 1] = xs[hi];
+        else {
+            list_add(runs, xs[lo]);
+            list_add(runs, xs[hi]);
+        }
+        return;
+    }
+    added = added || t->n_add > 0;
+    mid = (lo + hi) / 2;
+    tree_runs(tree, 2 * node, lo, mid, added, xs, runs);
+    tree_runs(tree, 2 * node + 1, mid, hi, added, xs, runs);
+}
+
+void add_band (IntList* out, IntList* runs, int y0, int y1) {
+    // append (x, y, w, h) for each run in a band
     int i;
+    for (i = 0; i < runs->n; i += 2) {
+        list_add(out, runs->data[i]);
+        list_add(out, y0);
+        list_add(out, runs->data[i + 1] - runs->data[i]);
+        list_add(out, y1 - y0);
+    }
+}
+
+int* disjoint_rects (int* rects, int n_add, int n_rm, int* n_out) {
+    // rects is (x, y, w, h) for n_add rects then n_rm rects; returns
+    // (x, y, w, h) for n_out disjoint rects covering the area covered by an
+    // add rect and no rm rect, sweeping down through horizontal bands and
+    // merging bands with the same runs; free the result with PyMem_Free
+    int n = n_add + n_rm, n_xs = 0, n_edges = 0, i, j, n_leaves, y0, same;
+    int* xs, * r;
+    HEdge* edges, * e;
+    Node* tree;
+    IntList out = {NULL, 0, 0}, runs[2] = {{NULL, 0, 0}, {NULL, 0, 0}}, tmp;
+    xs = PyMem_New(int, 2 * n + 1); // NOTE: alloc[+1]
+    edges = PyMem_New(HEdge, 2 * n + 1); // NOTE: alloc[+2]
     for (i = 0; i < n; i++) {
-        if (arr[i] == x) return 0;
+        r = rects + 4 * i;
+        if (r[2] > 0 && r[3] > 0) {
+            xs[n_xs++] = r[0];
+            xs[n_xs++] = r[0] + r[2];
+        }
+    }
+    // unique sorted x edges
+    qsort(xs, n_xs, sizeof(int), cmp_int);
+    for (i = j = 0; i < n_xs; i++) {
+        if (j == 0 || xs[i] != xs[j - 1]) xs[j++] = xs[i];
     }
-    arr[n] = x;
-    return 1;
+    n_xs = j;
+    for (i = 0; i < n; i++) {
+        r = rects + 4 * i;
+        if (r[2] > 0 && r[3] > 0) {
+            for (j = 0; j < 2; j++) { // top/bottom
+                e = edges + n_edges++;
+                e->y = r[1] + j * r[3];
+                e->x0 = index_of(xs, n_xs, r[0]);
+                e->x1 = index_of(xs, n_xs, r[0] + r[2]);
+                e->rm = i >= n_add;
+                e->delta = j ? -1 : 1;
+            }
+        }
+    }
+    qsort(edges, n_edges, sizeof(HEdge), cmp_hedge);
+    // leaves are the ranges between x edges
+    n_leaves = n_xs - 1;
+    j = 4 * (n_leaves > 0 ? n_leaves : 1);
+    tree = PyMem_New(Node, j); // NOTE: alloc[+3]
+    memset(tree, 0, j * sizeof(Node));
+    // runs[0] is for the band being extended, which started at y0
+    y0 = 0;
+    for (i = 0; i < n_edges; ) {
+        // apply all edges at this y
+        j = i;
+        while (i < n_edges && edges[i].y == edges[j].y) {
+            tree_update(tree, 1, 0, n_leaves, edges + i);
+            i++;
+        }
+        runs[1].n = 0;
+        if (i < n_edges) tree_runs(tree, 1, 0, n_leaves, 0, xs, runs + 1);
+        same = runs[0].n == runs[1].n &&
+               (runs[0].n == 0 ||
+                !memcmp(runs[0].data, runs[1].data, runs[0].n * sizeof(int)));
+        if (!same) {
+            // band ended
+            add_band(&out, runs, y0, edges[j].y);
+            y0 = edges[j].y;
+            tmp = runs[0];
+            runs[0] = runs[1];
+            runs[1] = tmp;
+        }
+    }
+    PyMem_Free(runs[0].data);
+    PyMem_Free(runs[1].data);
+    PyMem_Free(tree); // NOTE: alloc[-3]
+    PyMem_Free(edges); // NOTE: alloc[-2]
+    PyMem_Free(xs); // NOTE: alloc[-1]
+    *n_out = out.n / 4;
+    return out.data;
 }
 
 PyObject* mk_disjoint (PyObject* add, PyObject* rm) {
     // both arguments are [pygame.Rect]
-    int n_rects[2], n_edges[2], i, j, k, l, row0, row1, col0, col1, in_rect,
-        r_i, r_left;
+    int n_rects[2], n_out, i, j;
     PyRectObject** rects[2];
     GAME_Rect r;
-    int* edges[2], * grid;
+    int* in, * out;
     PyObject* r_o, * rs;
     // turn into arrays
     add = PySequence_Fast(add, "expected list"); // NOTE: ref[+1]
@@ -66,94 +218,29 @@ PyObject* mk_disjoint (PyObject* add, PyObject* rm) {
     n_rects[1] = PySequence_Fast_GET_SIZE(rm);
     rects[0] = (PyRectObject**) PySequence_Fast_ITEMS(add);
     rects[1] = (PyRectObject**) PySequence_Fast_ITEMS(rm);
-    // get edges
-    n_edges[0] = 0;
-    n_edges[1] = 0;
-    i = 2 * (n_rects[0] + n_rects[1]); // max number of edges
-    edges[0] = PyMem_New(int, i);
-    edges[1] = PyMem_New(int, i); // NOTE: alloc[+1]
-    for (i = 0; i < 2; i++) { // rects
-        for (j = 0; j < n_rects[i]; j++) { // add|rm
-            r = rects[i][j]->r;
-            n_edges[0] += set_add(edges[0], n_edges[0], r.x);
-            n_edges[0] += set_add(edges[0], n_edges[0], r.x + r.w);
-            n_edges[1] += set_add(edges[1], n_edges[1], r.y);
-            n_edges[1] += set_add(edges[1], n_edges[1], r.y + r.h);
-        }
-    }
-    // sort edges
-    quicksort(edges[0], n_edges[0]);
-    quicksort(edges[1], n_edges[1]);
-    // generate grid of (rows of) subrects and mark contents
-    // each has 2 if add, has no 1 if rm
-    i = (n_edges[0] - 1) * (n_edges[1] - 1);
-    grid = PyMem_New(int, i); // NOTE: alloc[+2]
-    for (j = 0; j < i; j++) grid[j] = 1;
+    // NOTE: alloc[+1]
+    in = PyMem_New(int, 4 * (n_rects[0] + n_rects[1]) + 1);
     for (i = 0; i < 2; i++) { // rects
         for (j = 0; j < n_rects[i]; j++) { // add|rm
             r = rects[i][j]->r;
-            if (r.w > 0 && r.h > 0) {
-                row0 = find(edges[1], n_edges[1], r.y, 0);
-                row1 = find(edges[1], n_edges[1], r.y + r.h, row0);
-                col0 = find(edges[0], n_edges[0], r.x, 0);
-                col1 = find(edges[0], n_edges[0], r.x + r.w, col0);
-                for (k = row0; k < row1; k++) { // rows
-                    for (l = col0; l < col1; l++) { // cols
-                        if (i == 0) // add
-                            grid[(n_edges[0] - 1) * k + l] |= 2;
-                        else // rm (i == 1)
-                            grid[(n_edges[0] - 1) * k + l] ^= 1;
-                    }
-                }
-            }
+            out = in + 4 * (i * n_rects[0] + j);
+            out[0] = r.x;
+            out[1] = r.y;
+            out[2] = r.w;
+            out[3] = r.h;
         }
     }
-    // generate subrects
-    rs = PyList_New(0);
-    in_rect = 0;
-    for (i = 0; i < n_edges[1] - 1; i++) { // rows
-        for (j = 0; j < n_edges[0] - 1; j++) { // cols
-            if (in_rect && i != r_i) {
-                // on a different row: rect ended
-                in_rect = 0;
-                k = edges[1][r_i];
-                // NOTE: ref[+3]
-                r_o = PyRect_New4(r_left, k, edges[0][n_edges[0] - 1] - r_left,
-                                  edges[1][r_i + 1] - k);
-                PyList_Append(rs, r_o);
-                Py_DECREF(r_o); // NOTE: ref[-3]
-            }
-            if (grid[(n_edges[0] - 1) * i + j] == 3) { // add and not rm
-                if (!in_rect) {
-                    in_rect = 1;
-                    r_i = i;
-                    r_left = edges[0][j];
-                }
-            } else if (in_rect) {
-                // rect ended
-                in_rect = 0;
-                k = edges[1][r_i];
-                // NOTE: ref[+3]
-                r_o = PyRect_New4(r_left, k, edges[0][j] - r_left,
-                                  edges[1][r_i + 1] - k);
-                PyList_Append(rs, r_o);
-                Py_DECREF(r_o); // NOTE: ref[-3]
-            }
-        }
-    }
-    if (in_rect) {
-        // last rect ended
-        k = edges[1][r_i];
-        // NOTE: ref[+3]
-        r_o = PyRect_New4(r_left, k, edges[0][n_edges[0] - 1] - r_left,
-                          edges[1][r_i + 1] - k);
-        PyList_Append(rs, r_o);
-        Py_DECREF(r_o); // NOTE: ref[-3]
+    // NOTE: alloc[+2]
+    out = disjoint_rects(in, n_rects[0], n_rects[1], &n_out);
+    rs = PyList_New(n_out);
+    for (i = 0; i < n_out; i++) {
+        r_o = PyRect_New4(out[4 * i], out[4 * i + 1], out[4 * i + 2],
+                          out[4 * i + 3]);
+        PyList_SET_ITEM(rs, i, r_o); // steals reference
     }
     // cleanup
-    PyMem_Free(grid); // NOTE: alloc[-2]
-    PyMem_Free(edges[0]);
-    PyMem_Free(edges[1]); // NOTE: alloc[-1]
+    PyMem_Free(out); // NOTE: alloc[-2]
+    PyMem_Free(in); // NOTE: alloc[-1]
     Py_DECREF(rm); // NOTE: ref[-2]
     Py_DECREF(add); // NOTE: ref[-1]
     return rs;
@@ -356,8 +443,18 @@ end:
     return rtn;
 }
 
+PyObject* py_mk_disjoint (PyObject* self, PyObject* args) {
+    // exposed for testing and benchmarking
+    PyObject* add, * rm;
+    if (!PyArg_UnpackTuple(args, "mk_disjoint", 2, 2, &add, &rm))
+        return NULL;
+    return mk_disjoint(add, rm);
+}
+
 PyMethodDef methods[] = {
     {"fastdraw", fastdraw, METH_VARARGS, "Draw everything."},
+    {"mk_disjoint", py_mk_disjoint, METH_VARARGS,
+     "Split the area covered by some rects but not others into disjoint rects."},
     {NULL, NULL, 0, NULL}
 };
 
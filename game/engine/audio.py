@@ -0,0 +1,164 @@
+"""Sound playback.
+
+:class:`SoundBank` keeps decoded sounds in memory and plays them through a
+fixed pool of channels; the :class:`game.Game` instance keeps one in
+:attr:`game.Game.sounds`, and flushes its queue once per frame.
+
+"""
+
+from random import randrange
+
+import pygame as pg
+
+from conf import conf
+
+
+class SoundBank (object):
+    """Decoded sounds played through a pool of reserved mixer channels.
+
+SoundBank(n_channels = 8)
+
+:arg n_channels: the number of channels to reserve for playing sounds.
+
+Sounds are found as for :meth:`game.Game.play_snd`.  Each is decoded the first
+time it's played, or by :meth:`preload`, with its volume set from
+:data:`conf.SOUND_VOLUME` and :data:`conf.SOUND_VOLUMES`.  If every channel is
+busy when a sound is played, the one that started playing longest ago is
+stopped and used instead.  If the mixer isn't initialised, nothing is decoded
+or played.
+
+Sounds may also be queued by :meth:`queue` and played together by
+:meth:`flush`, which limits how often each sound plays (see
+:data:`conf.SOUND_MAX_PER_FRAME` and :data:`conf.SOUND_MIN_INTERVAL`).
+
+"""
+
+    def __init__ (self, n_channels = 8):
+        #: ``{base_id: sounds}``, where ``sounds`` is a list of
+        #: ``pygame.mixer.Sound`` instances, or ``None`` for invalid files.
+        self.sounds = {}
+        #: Whether the mixer was initialised when the bank was created.
+        self.enabled = bool(pg.mixer.get_init())
+        if self.enabled:
+            if pg.mixer.get_num_channels() < n_channels:
+                pg.mixer.set_num_channels(n_channels)
+            pg.mixer.set_reserved(n_channels)
+        else:
+            n_channels = 0
+        #: The ``pygame.mixer.Channel`` instances sounds are played on.
+        self.channels = [pg.mixer.Channel(i) for i in xrange(n_channels)]
+        # channel indices, least recently started first
+        self._order = range(n_channels)
+        # {base_id: [num_queued, max_volume]}
+        self._queued = {}
+        # {base_id: time last played}, by time passed to flush
+        self._last_played = {}
+        self._t = 0
+
+    def load (self, base_id):
+        """Decode all variants of a sound, if not already done.
+
+load(base_id) -> sounds
+
+:arg base_id: the identifier of the sound (as taken by
+              :meth:`game.Game.play_snd`).
+
+:return: the list stored in :attr:`sounds` for this identifier.
+
+"""
+        sounds = self.sounds.get(base_id)
+        if sounds is None and not self.enabled:
+            # no mixer to decode them with
+            sounds = self.sounds[base_id] = [None] * conf.SOUNDS[base_id]
+        elif sounds is None:
+            volume = conf.SOUND_VOLUME * conf.SOUND_VOLUMES[base_id]
+            sounds = []
+            for i in xrange(conf.SOUNDS[base_id]):
+                snd = pg.mixer.Sound(conf.SOUND_DIR + base_id + str(i) + '.ogg')
+                if snd.get_length() < 10 ** -3:
+                    # no way this is valid
+                    snd = None
+                else:
+                    snd.set_volume(volume)
+                sounds.append(snd)
+            self.sounds[base_id] = sounds
+        return sounds
+
+    def preload (self):
+        """Decode every sound in :data:`conf.SOUNDS`."""
+        for base_id in conf.SOUNDS:
+            self.load(base_id)
+
+    def clear (self):
+        """Forget all decoded sounds (to pick up changed volume settings)."""
+        self.sounds = {}
+
+    def play (self, base_id, volume = 1):
+        """Play a randomly chosen variant of a sound.
+
+Takes the same arguments as :meth:`game.Game.play_snd`.
+
+:return: the ``pygame.mixer.Channel`` the sound is playing on, or ``None``.
+
+"""
+        sounds = self.load(base_id)
+        snd = sounds[randrange(len(sounds))]
+        if snd is None or not self.channels:
+            return None
+        order = self._order
+        channels = self.channels
+        for j, i in enumerate(order):
+            if not channels[i].get_busy():
+                break
+        else:
+            # all busy: steal the oldest
+            j = 0
+        i = order.pop(j)
+        order.append(i)
+        channel = channels[i]
+        channel.play(snd)
+        # channel volume multiplies the sound's volume
+        channel.set_volume(volume)
+        return channel
+
+    def queue (self, base_id, volume = 1):
+        """Queue a sound to be played by the next call to :meth:`flush`.
+
+Takes the same arguments as :meth:`play`.
+
+"""
+        queued = self._queued.get(base_id)
+        if queued is None:
+            self._queued[base_id] = [1, volume]
+        else:
+            queued[0] += 1
+            if volume > queued[1]:
+                queued[1] = volume
+
+    def flush (self, dt = 0):
+        """Play queued sounds.
+
+flush(dt = 0)
+
+:arg dt: the time in seconds since the last call.
+
+Each queued sound plays at most :data:`conf.SOUND_MAX_PER_FRAME` times, at the
+highest volume it was queued with, and not at all if it was played less than
+:data:`conf.SOUND_MIN_INTERVAL` seconds ago; the rest are dropped.
+
+"""
+        self._t = t = self._t + dt
+        if not self._queued:
+            return
+        queued = self._queued
+        self._queued = {}
+        last_played = self._last_played
+        max_per_frame = conf.SOUND_MAX_PER_FRAME
+        min_interval = conf.SOUND_MIN_INTERVAL
+        for base_id, (n, volume) in queued.iteritems():
+            last = last_played.get(base_id)
+            if last is not None and t - last < min_interval[base_id]:
+                continue
+            last_played[base_id] = t
+            for i in xrange(min(n, max_per_frame[base_id])):
+                self.play(base_id, volume)
@@ -17,7 +17,33 @@ class Conf (object):
     GAME = None
     IDENT = 'game'
     FPS = dd(60) # per-backend
+    # let schedulers adjust their FPS between FPS_RANGE values according to
+    # how long frames take
+    FPS_GOVERNOR = False
+    FPS_RANGE = dd(None) # per-world (min, max); None to keep to FPS
+    # per-world; also lower FPS while frames draw nothing
+    FPS_LOWER_WHEN_INACTIVE = dd(False)
+    # proportion of a frame spent working (not waiting) below which FPS is
+    # raised and above which it's lowered
+    FPS_LOAD = (.5, .85)
+    FPS_STEP = (1.02, 1.05) # (raise, lower) factor per frame
     DEBUG = False
+    # no window or audio output, and run frames as fast as possible
+    HEADLESS = False
+    # run simulation steps at a fixed rate (FPS), several per drawn frame if
+    # drawing falls behind (up to MAX_STEPS_PER_FRAME), rather than one each
+    FIXED_TIMESTEP = False
+    MAX_STEPS_PER_FRAME = 5
+    # stop sleeping this many seconds before a frame is due, and spin instead
+    FRAME_SPIN_TIME = .002
+    # while the world is idle and nothing needs drawing, wait for an event or
+    # timeout instead of running frames; while the window is minimised, stop
+    # running frames at all
+    IDLE_WAIT = True
+    # record per-phase timings for recent frames (Game.frame_stats)
+    FRAME_STATS = False
+    FRAME_STATS_SIZE = 600 # number of frames to keep
+    FRAME_STATS_FILE = None # write them here as CSV when the game stops
 
     # paths
     # need to take care to get unicode path
@@ -52,6 +78,9 @@ class Conf (object):
     WINDOW_TITLE = ''
     MOUSE_VISIBLE = dd(False) # per-backend
     FLAGS = 0
+    # (per-rect, per-pixel) seconds taken to update the display, used to merge
+    # dirty rects; None to measure at startup and when the mode changes
+    DISPLAY_UPDATE_COST = None
     FULLSCREEN = False
     RESIZABLE = False # also determines whether fullscreen togglable
     RES_W = (960, 540)
@@ -61,6 +90,7 @@ class Conf (object):
 
     # input
     KEYS_MINIMISE = (pg.K_F10,)
+    KEYS_FRAME_STATS = (pg.K_F9,)
     KEYS_FULLSCREEN = (pg.K_F11, (pg.K_RETURN, pg.KMOD_ALT, True),
                     (pg.K_KP_ENTER, pg.KMOD_ALT, True))
     KEYS_NEXT = (pg.K_RETURN, pg.K_SPACE, pg.K_KP_ENTER)
@@ -76,7 +106,14 @@ class Conf (object):
     MUSIC_VOLUME = dd(.5) # per-backend
     SOUND_VOLUME = .5
     EVENT_ENDMUSIC = pg.USEREVENT
+    EVENT_WAKE = pg.USEREVENT + 1 # used to stop waiting when idle
     SOUND_VOLUMES = dd(1)
+    SOUND_CHANNELS = 8 # reserved for sounds; the oldest is reused when all busy
+    SOUND_PRELOAD = True # decode all sounds at startup instead of on first use
+    # sounds requested many times in one frame play at most this many times
+    SOUND_MAX_PER_FRAME = dd(1)
+    # and don't play again until this many seconds have passed
+    SOUND_MIN_INTERVAL = dd(0)
     # generate SOUNDS = {ID: num_sounds}
     SOUNDS = {}
     ss = glob(join_path(SOUND_DIR, '*.ogg'))
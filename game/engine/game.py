@@ -8,7 +8,7 @@ playing audio.
 """
 
 import os
-from random import choice, randrange
+from random import choice
 
 import pygame as pg
 from pygame.display import update as update_display
@@ -18,7 +18,9 @@ import gm
 from sched import Scheduler
 import eh
 from mltr import Fonts
-from util import ir, convert_sfc
+from audio import SoundBank
+import perf
+from util import ir, convert_sfc, combine_drawn, coalesce_rects
 
 
 def get_world_id (world):
@@ -38,16 +40,24 @@ See :attr:`World.id` for details.
 def run (*args, **kwargs):
     """Run the game.
 
-Takes the same arguments as :class:`Game`, with an optional keyword-only
-argument ``t`` to run for this many seconds.
+Takes the same arguments as :class:`Game`, with optional keyword-only arguments
+``t`` to run for this many seconds and ``frames`` to run for this many frames
+(``t`` takes precedence).
+
+:return: the total number of frames run.
 
 """
     t = kwargs.pop('t', None)
+    frames = kwargs.pop('frames', None)
     global restarting
     restarting = True
+    n_frames = 0
     while restarting:
         restarting = False
-        Game(*args, **kwargs).run(t)
+        game = Game(*args, **kwargs)
+        game.run(t, frames)
+        n_frames += game.n_frames
+    return n_frames
 
 
 class World (object):
@@ -65,6 +75,12 @@ World(scheduler, evthandler)
     #: A unique identifier used for some settings in :obj:`conf`; if ``None``,
     #: ``type(world).__name__.lower()`` will be used.
     id = None
+    #: Whether :meth:`update` currently does nothing, so that frames only need
+    #: to run when events arrive, timeouts are due or graphics change (the
+    #: game then waits for these instead of running frames; see
+    #: :attr:`sched.Scheduler.idle`).  This might be set while paused, for
+    #: example.
+    idle = False
 
     def __init__ (self, scheduler, evthandler):
         #: :class:`sched.Scheduler` instance taken by the constructor.
@@ -120,9 +136,19 @@ Takes the same arguments as :meth:`create_world` and passes them to it.
 
     def __init__ (self, *args, **kwargs):
         conf.GAME = self
-        conf.RES_F = pg.display.list_modes()[0]
+        modes = pg.display.list_modes()
+        # -1 means any resolution is fine (the dummy video driver does this)
+        conf.RES_F = modes[0] if modes and modes != -1 else conf.RES_W
         self._quit = False
         self._update_again = False
+        self.n_frames = 0 #: The number of frames run so far.
+        #: A :class:`perf.FrameStats` instance recording frame timings; it is
+        #: enabled if :data:`conf.FRAME_STATS` is ``True``.
+        self.frame_stats = perf.FrameStats(conf.FRAME_STATS_SIZE)
+        self.frame_stats.enabled = conf.FRAME_STATS
+        self._stats_rect = None
+        self._timing = False
+        self._minimised = False
         self.world = None #: The currently running world.
         #: A list of previous (nested) worlds, most 'recent' last.
         self.worlds = []
@@ -135,6 +161,10 @@ Takes the same arguments as :meth:`create_world` and passes them to it.
         self.refresh_display()
         #: A :class:`mltr.Fonts` instance.
         self.fonts = Fonts(conf.FONT_DIR)
+        #: A :class:`audio.SoundBank` instance used by :meth:`play_snd`.
+        self.sounds = SoundBank(conf.SOUND_CHANNELS)
+        if conf.SOUND_PRELOAD:
+            self.sounds.preload()
         # start first world
         self.start_world(*args, **kwargs)
         # start playing music
@@ -167,18 +197,29 @@ should be passed to that base class).
 
 """
         scheduler = Scheduler()
-        scheduler.add_timeout(self._update, frames = 1, repeat_frames = 1)
+        scheduler.throttle = not conf.HEADLESS
+        scheduler.fixed_step = conf.FIXED_TIMESTEP
+        scheduler.render = self._draw
+        if conf.IDLE_WAIT:
+            scheduler.idle = self._idle
+        scheduler.add_timeout(self._update, frames = 1, repeat_frames = 1,
+                              passive = True)
         evthandler = eh.EventHandler({
             pg.ACTIVEEVENT: self._active_cb,
             pg.VIDEORESIZE: self._resize_cb,
             conf.EVENT_ENDMUSIC: self.play_music
         }, [
             (conf.KEYS_FULLSCREEN, self.toggle_fullscreen, eh.MODE_ONDOWN),
-            (conf.KEYS_MINIMISE, self.minimise, eh.MODE_ONDOWN)
+            (conf.KEYS_MINIMISE, self.minimise, eh.MODE_ONDOWN),
+            (conf.KEYS_FRAME_STATS, self.toggle_frame_stats, eh.MODE_ONDOWN)
         ], False, self.quit)
         # instantiate class
         world = cls(scheduler, evthandler, *args)
-        scheduler.fps = conf.FPS[get_world_id(world)]
+        ident = get_world_id(world)
+        scheduler.fps = conf.FPS[ident]
+        if conf.FPS_GOVERNOR and conf.FPS_RANGE[ident] is not None:
+            scheduler.fps_range = conf.FPS_RANGE[ident]
+            scheduler.lower_when_inactive = conf.FPS_LOWER_WHEN_INACTIVE[ident]
         return world
 
     def _select_world (self, world):
@@ -196,6 +237,7 @@ should be passed to that base class).
             fonts[k] = v
         pg.mouse.set_visible(conf.MOUSE_VISIBLE[i])
         pg.mixer.music.set_volume(conf.MUSIC_VOLUME[i])
+        self._set_paused()
         world._select()
         world.select()
 
@@ -350,22 +392,24 @@ Returns the same as :meth:`mltr.Fonts.render`
         return result
 
     def clear_caches (self, *caches):
-        """Clear image caches.
+        """Clear media caches.
 
-Takes any number of strings ``'file'``, ``'image'`` and ``'text'`` as
-arguments, which determine whether to clear :attr:`file_cache`,
-:attr:`img_cache` and :attr:`text_cache` respectively.  If none are given, all
-caches are cleared.
+Takes any number of strings ``'file'``, ``'image'``, ``'text'`` and ``'sound'``
+as arguments, which determine whether to clear :attr:`file_cache`,
+:attr:`img_cache`, :attr:`text_cache` and the sounds decoded by :attr:`sounds`
+respectively.  If none are given, all caches are cleared.
 
 """
         if not caches:
-            caches = ('file', 'image', 'text')
+            caches = ('file', 'image', 'text', 'sound')
         if 'file' in caches:
             self.file_cache = {}
         if 'image' in caches:
             self.img_cache = {}
         if 'text' in caches:
             self.text_cache = {}
+        if 'sound' in caches:
+            self.sounds.clear()
 
     def play_snd (self, base_id, volume = 1):
         """Play a sound.
@@ -377,17 +421,11 @@ play_snd(base_id, volume = 1)
               :data:`conf.SOUNDS`).
 :arg float volume: amount scale the playback volume by.
 
+Sounds are queued in :attr:`sounds` and played at the end of the frame's
+update, so that many requests for the same sound in one frame are combined.
+
 """
-        ident = randrange(conf.SOUNDS[base_id])
-        # load sound
-        snd = conf.SOUND_DIR + base_id + str(ident) + '.ogg'
-        snd = pg.mixer.Sound(snd)
-        if snd.get_length() < 10 ** -3:
-            # no way this is valid
-            return
-        volume *= conf.SOUND_VOLUME * conf.SOUND_VOLUMES[base_id]
-        snd.set_volume(volume)
-        snd.play()
+        self.sounds.queue(base_id, volume)
 
     def find_music (self):
         """Store a list of the available music files in :attr:`music`."""
@@ -437,6 +475,12 @@ refresh_display()
             r[1] = min(r[1], r[0] / ratio)
         conf.RES = r
         self.screen = pg.display.set_mode(conf.RES, flags)
+        #: ``(rect_cost, pixel_cost)`` estimated for updating the display, as
+        #: returned by :func:`perf.display_update_cost` (or from
+        #: :data:`conf.DISPLAY_UPDATE_COST`).
+        self.display_cost = conf.DISPLAY_UPDATE_COST
+        if self.display_cost is None:
+            self.display_cost = perf.display_update_cost()
         if self.world is not None:
             self.world.graphics.dirty()
 
@@ -458,10 +502,32 @@ minimise()
 """
         pg.display.iconify()
 
+    def toggle_frame_stats (self, *args):
+        """Toggle showing frame timings on the screen.
+
+toggle_frame_stats()
+
+Showing timings starts recording them if necessary (see :attr:`frame_stats`).
+
+"""
+        stats = self.frame_stats
+        stats.overlay = not stats.overlay
+        stats.enabled = stats.overlay or conf.FRAME_STATS
+
     def _active_cb (self, event):
-        """Callback to handle window focus loss."""
+        """Callback to handle window focus loss and minimisation."""
         if event.state == 2 and not event.gain:
             self.world.pause()
+        if event.state & pg.APPACTIVE:
+            self._minimised = not event.gain
+            if event.gain:
+                # not drawn while minimised
+                self.world.graphics.dirty()
+        self._set_paused()
+
+    def _set_paused (self):
+        """Pause the current world's scheduler while the window is minimised."""
+        self.world.scheduler.paused = conf.IDLE_WAIT and self._minimised
 
     def _resize_cb (self, event):
         """Callback to handle a window resize."""
@@ -469,39 +535,93 @@ minimise()
         self.refresh_display()
 
     def _update (self):
-        """Update worlds and draw."""
+        """Update worlds, and draw unless the scheduler draws separately."""
+        stats = self.frame_stats
+        self._timing = timing = stats.enabled
+        scheduler = self.world.scheduler
+        if timing and not scheduler.step:
+            # record each rendered frame, including all its steps
+            stats.start(scheduler)
         self._update_again = True
         while self._update_again:
             self._update_again = False
             self.world.evthandler.update()
+            if timing:
+                stats.lap(perf.EVENTS)
             # if a new world was created during the above call, we'll end up
             # updating twice before drawing
             if not self._update_again:
                 self._update_again = False
                 self.world.update()
+                if timing:
+                    stats.lap(perf.UPDATE)
+        self.sounds.flush(self.world.scheduler.frame)
+        if not self.world.scheduler.fixed_step:
+            self._draw()
+        self.n_frames += 1
+        return True
+
+    def _idle (self):
+        """Whether there's nothing to do until an event arrives."""
+        world = self.world
+        if not world.idle:
+            return False
+        return not (world.graphics.needs_draw or self.frame_stats.overlay)
+
+    def _draw (self):
+        """Draw the current world and update the display."""
+        if self._minimised:
+            return
+        stats = self.frame_stats
+        timing = self._timing and stats.enabled
+        if self._stats_rect is not None:
+            # draw over the last frame timings shown
+            self.world.graphics.dirty(self._stats_rect)
+            self._stats_rect = None
         drawn = self.world.draw()
+        if stats.overlay:
+            self._stats_rect = r = stats.draw(self.screen)
+            drawn = combine_drawn(drawn, [r])
+        if timing:
+            stats.lap(perf.DRAW)
+        self.world.scheduler.frame_active = bool(drawn)
         # update display
         if drawn is True:
             update_display()
         elif drawn:
-            if len(drawn) > 60: # empirical - faster to update everything
+            # merge rects, or update everything, when cheaper
+            drawn = coalesce_rects(drawn, *self.display_cost,
+                                   size = self.screen.get_size())
+            if drawn is True:
                 update_display()
             else:
                 update_display(drawn)
-        return True
+        if timing:
+            stats.lap(perf.DISPLAY)
 
     # running
 
-    def run (self, t = None):
+    def run (self, t = None, frames = None):
         """Main loop.
 
-run([t])
+run([t][, frames])
 
-:arg t: stop after this many seconds (else run forever).
+:arg t: stop after this many seconds.
+:arg frames: stop after this many frames; ignored if ``t`` is given.
+
+If neither ``t`` nor ``frames`` is given, run forever.
 
 """
-        while not self._quit and (t is None or t > 0):
-            t = self.world.scheduler.run(seconds = t)
+        while not self._quit and (t is None or t > 0) and \
+              (frames is None or frames > 0):
+            remain = self.world.scheduler.run(seconds = t, frames = frames)
+            if t is not None:
+                t = remain
+            else:
+                frames = remain
+        if conf.FRAME_STATS_FILE is not None:
+            self.frame_stats.finish()
+            self.frame_stats.dump_csv(conf.FRAME_STATS_FILE)
 
     def quit (self, *args):
         """Quit the game.
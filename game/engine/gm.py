@@ -38,10 +38,11 @@ from math import sin, cos, pi
 from collections import OrderedDict
 
 import pygame as pg
+import numpy as np
 from pygame import Rect
 
 from conf import conf
-from util import ir
+from util import ir, merge_runs
 from _gm import fastdraw
 
 
@@ -993,6 +994,10 @@ transformations.
                   blit_flags = 0):
         #: The ``scheduler`` argument passed to the constructor.
         self.scheduler = scheduler
+        # dirty cells (see set_dirty_grid), and the cell size and origin
+        self._grid = None
+        self._grid_cell = None
+        self._grid_origin = None
         self._init_as_graphic = False
         self._init_as_graphic_args = (pos, layer, blit_flags)
         self._surface = None
@@ -1024,6 +1029,8 @@ Set this directly (can be ``None`` to do nothing).
             self._surface = sfc
             if sfc is not None:
                 self._rect = sfc.get_rect()
+                if self._grid_cell is not None:
+                    self._mk_grid()
                 self.dirty()
                 if not self._init_as_graphic:
                     Graphic.__init__(self, sfc, *self._init_as_graphic_args)
@@ -1155,11 +1162,128 @@ the current surface is flagged.
         if self._surface is None:
             # nothing to mark as dirty (happens in assigning a surface)
             return
-        if rects:
+        if self._grid is not None:
+            if rects:
+                mark = self._grid_mark
+                for r in rects:
+                    mark(r)
+            else:
+                self._grid[:] = True
+        elif rects:
             self._gm_dirty += [Rect(r) for r in rects]
         else:
             self._gm_dirty = [self._rect]
 
+    def set_dirty_grid (self, cell_size = None, origin = (0, 0)):
+        """Track dirty areas in a grid of cells instead of a list of rects.
+
+set_dirty_grid([cell_size], origin = (0, 0))
+
+:arg cell_size: the width and height of each cell, or ``None`` to go back to
+                tracking rects.
+:arg origin: a position on the surface where a cell's top-left corner lies.
+
+In this mode, dirty areas, including those of graphics, mark every cell they
+touch, and whole cells are redrawn.  This suits worlds which change in aligned
+tiles (with the tile size as ``cell_size``): marking cells is cheap however
+much changes, and each run of dirty cells in a row becomes one rect to draw in
+(merged with identical runs in adjacent rows).
+
+"""
+        self._grid_cell = cell_size
+        self._grid_origin = origin
+        if cell_size is None:
+            self._grid = None
+        elif self._surface is not None:
+            self._mk_grid()
+        self.dirty()
+
+    def _mk_grid (self):
+        """Create the dirty grid to cover the surface."""
+        s = self._grid_cell
+        w, h = self._rect.size
+        # move the origin to the top-left of the surface or beyond
+        ox, oy = self._grid_origin
+        ox = (ox % s) - s if ox % s else 0
+        oy = (oy % s) - s if oy % s else 0
+        self._grid_origin = (ox, oy)
+        self._grid = np.zeros(((h - oy + s - 1) // s, (w - ox + s - 1) // s),
+                              bool)
+
+    def _grid_mark (self, rect):
+        """Mark the cells touched by a rect as dirty."""
+        x, y, w, h = rect
+        if w <= 0 or h <= 0:
+            return
+        s = self._grid_cell
+        ox, oy = self._grid_origin
+        x0 = max((x - ox) // s, 0)
+        y0 = max((y - oy) // s, 0)
+        # round up
+        x1 = (x + w - ox + s - 1) // s
+        y1 = (y + h - oy + s - 1) // s
+        if x1 > x0 and y1 > y0:
+            self._grid[y0:y1, x0:x1] = True
+
+    def _grid_rects (self):
+        """Take graphics' dirty rects and get rects covering dirty cells."""
+        mark = self._grid_mark
+        for gs in self.graphics.itervalues():
+            for g in gs:
+                rects = g._dirty
+                # fastdraw handles visibility changes
+                if rects and g.visible == g.was_visible:
+                    if g.visible:
+                        for rect in (g._last_postrot_rect, g._postrot_rect):
+                            for r in rects:
+                                mark(Rect(r).clip(rect))
+                    g._dirty = []
+        grid = self._grid
+        ys = np.flatnonzero(grid.any(1))
+        if not len(ys):
+            return []
+        # starts and ends of runs of dirty cells in each row
+        padded = np.zeros((len(ys), grid.shape[1] + 2), np.int8)
+        padded[:, 1:-1] = grid[ys]
+        grid[:] = False
+        d = np.diff(padded)
+        rows, x0s = np.nonzero(d == 1)
+        x1s = np.nonzero(d == -1)[1]
+        # {(x0, x1): ys} for runs
+        runs = {}
+        for y, x0, x1 in zip(ys[rows].tolist(), x0s.tolist(), x1s.tolist()):
+            runs.setdefault((x0, x1), []).append(y)
+        s = self._grid_cell
+        ox, oy = self._grid_origin
+        sfc_rect = self._rect
+        return [Rect(ox + x * s, oy + y * s, w * s, h * s).clip(sfc_rect)
+                for x, y, w, h in merge_runs(runs)]
+
+    @property
+    def dirty_grid (self):
+        """The cell size given to :meth:`set_dirty_grid`, or ``None``."""
+        return self._grid_cell
+
+    @property
+    def needs_draw (self):
+        """Whether :meth:`draw` might change anything.
+
+This is ``False`` if no graphics have changed since the last draw and nothing
+has been marked dirty.
+
+"""
+        if self._surface is None:
+            return False
+        if self._gm_dirty or (self._grid is not None and self._grid.any()):
+            return True
+        for gs in self.graphics.itervalues():
+            for g in gs:
+                if g._dirty or g.visible != g.was_visible:
+                    return True
+                if isinstance(g, GraphicsManager) and g.needs_draw:
+                    return True
+        return False
+
     def draw (self):
         """Update the display.
 
@@ -1172,8 +1296,11 @@ changed parts of the surface, or ``False`` if nothing changed.
         if not layers or sfc is None:
             return False
         graphics = self.graphics
-        dirty = self._gm_dirty
-        self._gm_dirty = []
+        if self._grid is not None:
+            dirty = self._grid_rects()
+        else:
+            dirty = self._gm_dirty
+            self._gm_dirty = []
         return fastdraw(layers, sfc, graphics, dirty)
 
     def _pre_draw (self):
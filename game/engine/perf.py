@@ -0,0 +1,170 @@
+"""Frame timing instrumentation.
+
+:class:`FrameStats` records how long each phase of recent frames took; the
+:class:`game.Game` instance keeps one in :attr:`game.Game.frame_stats`.
+:func:`display_update_cost` measures how long updating the display takes.
+
+"""
+
+import csv
+from collections import deque
+from timeit import default_timer as time
+
+import pygame as pg
+
+#: Indices of phases in frames recorded by :class:`FrameStats`.
+EVENTS, UPDATE, DRAW, DISPLAY, OTHER, SLEEP = range(6)
+#: Names of the phases in frames recorded by :class:`FrameStats`, by index.
+PHASES = ('events', 'update', 'draw', 'display', 'other', 'sleep')
+
+
+class FrameStats (object):
+    """Records how long each phase of recent frames took.
+
+FrameStats(size = 600)
+
+:arg size: the number of recent frames to keep.
+
+Call :meth:`start` at the beginning of a frame, then :meth:`lap` at the end of
+each phase.  Phases are :const:`EVENTS`, :const:`UPDATE`, :const:`DRAW` and
+:const:`DISPLAY`.  The rest of the time the timer spent running the frame is
+recorded as :const:`OTHER` and the time it spent waiting afterwards as
+:const:`SLEEP`; these are filled in when the next frame starts, or by calling
+:meth:`finish`.
+
+"""
+
+    def __init__ (self, size = 600):
+        #: Recent frames, oldest first, each a list of durations in seconds
+        #: indexed by phase.
+        self.frames = deque(maxlen = size)
+        #: Whether to record frames; if ``False``, :meth:`start` and
+        #: :meth:`lap` should not be called.
+        self.enabled = False
+        #: Whether to show a summary of recent frames on the screen (see
+        #: :meth:`draw`).
+        self.overlay = False
+        self._t = None
+        self._current = None
+        self._timer = None
+        self._font = None
+        self._overlay_sfc = None
+        self._overlay_age = 0
+
+    def start (self, timer):
+        """Start recording a frame.
+
+:arg timer: the :class:`sched.Timer` running the frame.
+
+"""
+        self.finish()
+        self._timer = timer
+        self._current = c = [0.] * len(PHASES)
+        self.frames.append(c)
+        self._t = time()
+
+    def lap (self, phase):
+        """Add the time since the last call (or :meth:`start`) to a phase."""
+        t = time()
+        self._current[phase] += t - self._t
+        self._t = t
+
+    def finish (self):
+        """Fill in the timer's durations for the last frame recorded."""
+        c = self._current
+        if c is not None:
+            timer = self._timer
+            c[OTHER] = max(timer.busy_time - sum(c[:OTHER]), 0)
+            c[SLEEP] = timer.sleep_time
+            self._current = None
+
+    def summarise (self, n = None):
+        """Summarise recent frames.
+
+summarise([n]) -> (mean, worst)
+
+:arg n: the number of recent frames to include; defaults to all of them.
+
+:return: lists of the mean and maximum duration of each phase.
+
+"""
+        frames = list(self.frames)
+        if n is not None:
+            frames = frames[-n:]
+        if not frames:
+            return ([0] * len(PHASES), [0] * len(PHASES))
+        totals = [sum(ts) for ts in zip(*frames)]
+        return ([t / len(frames) for t in totals],
+                [max(ts) for ts in zip(*frames)])
+
+    def dump_csv (self, fn):
+        """Write recorded frames to a file as CSV, with durations in ms."""
+        with open(fn, 'wb') as f:
+            w = csv.writer(f)
+            w.writerow(PHASES)
+            for ts in self.frames:
+                w.writerow(['{0:.3f}'.format(1000 * t) for t in ts])
+
+    def draw (self, sfc, pos = (0, 0), period = 15):
+        """Draw a summary of recent frames.
+
+draw(sfc, pos = (0, 0), period = 15) -> rect
+
+:arg sfc: surface to draw to.
+:arg pos: the position of the top-left corner of the summary.
+:arg period: the summary is recomputed after this many calls (and covers this
+             many frames).
+
+:return: the rect drawn in.
+
+"""
+        self._overlay_age -= 1
+        if self._overlay_sfc is None or self._overlay_age <= 0:
+            self._overlay_age = period
+            if self._font is None:
+                self._font = pg.font.Font(None, 16)
+            font = self._font
+            mean, worst = self.summarise(period)
+            lines = ['{0:<8} {1:6.2f} {2:6.2f}'.format(phase, 1000 * m,
+                                                       1000 * w)
+                     for phase, m, w in zip(PHASES, mean, worst)]
+            lines.insert(0, '{0:<8} {1:>6} {2:>6}'.format('ms', 'mean', 'max'))
+            h = font.get_linesize()
+            w = max(font.size(line)[0] for line in lines)
+            self._overlay_sfc = o = pg.Surface((w + 4, h * len(lines) + 4))
+            for i, line in enumerate(lines):
+                o.blit(font.render(line, True, (255, 255, 255)),
+                       (2, 2 + i * h))
+        return sfc.blit(self._overlay_sfc, pos)
+
+
+def display_update_cost (n_rects = 100, repeat = 3):
+    """Measure how long it takes to update parts of the display.
+
+display_update_cost(n_rects = 100, repeat = 3) -> (rect_cost, pixel_cost)
+
+:arg n_rects: the number of small rects to update when measuring the cost of
+              each rect.
+:arg repeat: the number of measurements to take the best of.
+
+:return: the estimated time in seconds taken to update a rect, and to update
+         each pixel, when calling ``pygame.display.update``.  The display mode
+         must have been set.
+
+"""
+    update = pg.display.update
+    w, h = pg.display.get_surface().get_size()
+    rects = [pg.Rect(i * w / n_rects, i * h / n_rects, 1, 1)
+             for i in xrange(n_rects)]
+    t_rects = t_full = None
+    for i in xrange(repeat):
+        t0 = time()
+        update(rects)
+        t1 = time()
+        update()
+        t2 = time()
+        t_rects = t1 - t0 if t_rects is None else min(t_rects, t1 - t0)
+        t_full = t2 - t1 if t_full is None else min(t_full, t2 - t1)
+    rect_cost = t_rects / n_rects
+    pixel_cost = max(t_full - rect_cost, 0) / (w * h)
+    return (rect_cost, pixel_cost)
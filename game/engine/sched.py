@@ -1,28 +1,18 @@
 """Event scheduler."""
 
-from time import time
+from timeit import default_timer as time
+from collections import deque
 from bisect import bisect
+from heapq import heappush, heappop, heapify
 from math import cos, atan, exp
 from random import randrange, expovariate
 
+import pygame as pg
 from pygame.time import wait
+import numpy as np
 
 from util import ir
-
-
-def _match_in_nest (obj, x):
-    """Check if every object in a data structure is equal to some given object.
-
-_match_in_nest(obj, x)
-
-obj: data structure to look in: an arbitrarily nested list of lists.
-x: object to compare to  (not a list or tuple).
-
-"""
-    if isinstance(obj, (tuple, list)):
-        return all(_match_in_nest(o, x) == x for o in obj)
-    else:
-        return obj == x
+from conf import conf
 
 
 def call_in_nest (f, *args):
@@ -84,6 +74,67 @@ def _cmp_structure (x, y):
         return True
 
 
+def _mk_plan (args, leaves):
+    """Build a plan for :func:`_flatten` (see that function)."""
+    is_list = [isinstance(arg, (tuple, list)) for arg in args]
+    if any(is_list):
+        # as for call_in_nest
+        n = len(args[is_list.index(True)])
+        args = [arg if this_is_list else [arg] * n
+                for this_is_list, arg in zip(is_list, args)]
+        return [_mk_plan(inner_args, leaves) for inner_args in zip(*args)]
+    else:
+        leaves.append(args)
+        return None
+
+
+def _flatten (*args):
+    """Flatten similar data structures.
+
+_flatten(*args) -> (leaves, plan)
+
+:arg args: data structures as taken by :func:`call_in_nest`.
+
+:return: ``leaves`` is a list containing, for each non-list object in the
+         combined structure, a tuple of the corresponding objects from each
+         argument, in order; ``plan`` is passed to :func:`_unflatten` to build
+         the structure again.
+
+"""
+    leaves = []
+    plan = _mk_plan(args, leaves)
+    if isinstance(plan, list) and all(p is None for p in plan):
+        # a flat list: just store the length
+        plan = len(plan)
+    return (leaves, plan)
+
+
+def _rebuild (values, plan):
+    """Build a nested list from an iterator (for :func:`_unflatten`)."""
+    return [next(values) if p is None else _rebuild(values, p) for p in plan]
+
+
+def _unflatten (values, plan):
+    """Build a data structure from flat values.
+
+_unflatten(values, plan) -> structure
+
+:arg values: list of values, one for each leaf returned by :func:`_flatten`.
+:arg plan: as returned by :func:`_flatten`.
+
+:return: a structure like the arguments given to :func:`_flatten`, with
+         ``values`` as its non-list objects.  If the structure is a flat list,
+         this is ``values`` itself.
+
+"""
+    if plan is None:
+        return values[0]
+    elif isinstance(plan, int):
+        return values
+    else:
+        return _rebuild(iter(values), plan)
+
+
 def interp_linear (*waypoints):
     """Linear interpolation for :meth:`Scheduler.interp`.
 
@@ -134,37 +185,47 @@ interp_linear(*waypoints) -> f
         dt = float(ts[i1] - t0) / (i1 - (i0 - 1))
         for i in xrange(i0, i1):
             ts[i] = t0 + dt * (i - (i0 - 1))
-    interp_val = lambda r, v1, v2, v0: (r * (v2 - v1) + v1) \
-                                       if isinstance(v2, (int, float)) else v0
-
-    def val_gen ():
-        t = yield
-        while 1:
-            # get waypoints we're between
-            i = bisect(ts, t)
-            if i == 0:
-                # before start
-                t = yield vs[0]
-            elif i == len(ts):
-                # past end: use final value, then end
-                last_val = lambda vl, v0: vl if isinstance(vl, (int, float)) \
-                                             else v0
-                t = yield call_in_nest(last_val, vs[-1], vs[0])
-                yield None # to avoid StopIteration issues
-                return
-            else:
-                v1 = vs[i - 1]
-                v2 = vs[i]
-                t1 = ts[i - 1]
-                t2 = ts[i]
-                # get ratio of the way between waypoints
-                r = 1 if t2 == t1 else (t - t1) / (t2 - t1) # t is always float
-                t = yield call_in_nest(interp_val, r, v1, v2, vs[0])
-
-    # start the generator; get_val is its send method
-    g = val_gen()
-    g.next()
-    return g.send
+    return _Linear(vs, ts)
+
+
+class _Linear (object):
+    """Interpolation function returned by :func:`interp_linear`."""
+
+    def __init__ (self, vs, ts):
+        self.ts = ts
+        leaves, self.plan = _flatten(*vs)
+        is_num = lambda v: isinstance(v, (int, float))
+        # initial values, used for non-numbers
+        self.v0 = [vs[0] for vs in leaves]
+        # for each pair of consecutive waypoints, (v1, v2 - v1) for each
+        # number, or None for others
+        self.segments = [[(vs[i - 1], vs[i] - vs[i - 1]) if is_num(vs[i])
+                          else None for vs in leaves]
+                         for i in xrange(1, len(ts))]
+        self.v_end = [vs[-1] if is_num(vs[-1]) else vs[0] for vs in leaves]
+        self._ended = False
+
+    def __call__ (self, t):
+        if self._ended:
+            return None
+        ts = self.ts
+        # get waypoints we're between
+        i = bisect(ts, t)
+        if i == 0:
+            # before start
+            v = list(self.v0)
+        elif i == len(ts):
+            # past end: use final value, then end
+            self._ended = True
+            v = list(self.v_end)
+        else:
+            t1 = ts[i - 1]
+            t2 = ts[i]
+            # get ratio of the way between waypoints
+            r = 1 if t2 == t1 else (t - t1) / (t2 - t1) # t is always float
+            v = [v0 if seg is None else seg[0] + r * seg[1]
+                 for seg, v0 in zip(self.segments[i - 1], self.v0)]
+        return _unflatten(v, self.plan)
 
 
 def interp_target (v0, target, damp, freq = 0, speed = 0, threshold = 0):
@@ -190,42 +251,51 @@ interp_target(v0, target, damp, freq = 0, speed = 0, threshold = 0) -> f
     if v0 == target: # nothing to do
         return lambda t: None
 
-    def get_phase (v0, target, sped):
-        if freq == 0 or not isinstance(v0, (int, float)) or v0 == target:
-            return 0
-        else:
-            return atan(-(float(speed) / (v0 - target) + damp) / freq)
-
-    phase = call_in_nest(get_phase, v0, target, speed)
+    return _Target(v0, target, damp, freq, speed, threshold)
 
-    def get_amplitude (v0, target, phase):
-        if isinstance(v0, (int, float)):
-            return (v0 - target) / cos(phase) # cos(atan(x)) is never 0
 
-    amplitude = call_in_nest(get_amplitude, v0, target, phase)
+class _Target (object):
+    """Interpolation function returned by :func:`interp_target`."""
 
-    def get_val (t):
-        def interp_val (v0, target, amplitude, phase, threshold):
+    def __init__ (self, v0, target, damp, freq, speed, threshold):
+        self.damp = damp
+        self.freq = freq
+        leaves, self.plan = _flatten(v0, target, speed, threshold)
+        # (constant, amplitude, phase, target, threshold) for each number;
+        # amplitude is None if the value is constant
+        self.leaves = []
+        for v0, target, speed, threshold in leaves:
             if not isinstance(v0, (int, float)):
-                return v0
-            # amplitude is None if non-number
-            if amplitude is None or v0 == target:
-                if threshold is not None:
-                    return None
-                return v0
+                leaf = (v0, None, 0, target, threshold)
+            elif v0 == target:
+                leaf = (None if threshold is not None else v0, None, 0,
+                        target, threshold)
             else:
-                dist = amplitude * exp(-damp * t)
+                if freq == 0:
+                    phase = 0
+                else:
+                    phase = atan(-(float(speed) / (v0 - target) + damp) / freq)
+                amplitude = (v0 - target) / cos(phase) # cos(atan(x)) != 0
+                leaf = (None, amplitude, phase, target, threshold)
+            self.leaves.append(leaf)
+
+    def __call__ (self, t):
+        freq = self.freq
+        decay = exp(-self.damp * t)
+        rtn = []
+        for const, amplitude, phase, target, threshold in self.leaves:
+            if amplitude is None:
+                rtn.append(const)
+            else:
+                dist = amplitude * decay
                 if threshold is not None and abs(dist) <= threshold:
-                    return None
-                return dist * cos(freq * t + phase) + target
-
-        rtn = call_in_nest(interp_val, v0, target, amplitude, phase, threshold)
-        if _match_in_nest(rtn, None):
+                    rtn.append(None)
+                else:
+                    rtn.append(dist * cos(freq * t + phase) + target)
+        if all(v is None for v in rtn):
             # all done
-            rtn = None
-        return rtn
-
-    return get_val
+            return None
+        return _unflatten(rtn, self.plan)
 
 
 def interp_shake (centre, amplitude = 1, threshold = 0, signed = True):
@@ -249,25 +319,49 @@ interp(centre, amplitude = 1, threshold = 0, signed = True) -> f
 :return: a function that returns position given the current time.
 
 """
-    def get_val (t):
-        def interp_val (centre, amplitude, threshold):
+    return _Shake(centre, amplitude, threshold, signed)
+
+
+class _Shake (object):
+    """Interpolation function returned by :func:`interp_shake`."""
+
+    def __init__ (self, centre, amplitude, threshold, signed):
+        self.centre = centre
+        self.amplitude = amplitude
+        self.threshold = threshold
+        self.signed = signed
+        if not callable(amplitude):
+            self.leaves, self.plan = _flatten(centre, amplitude, threshold)
+
+    def __call__ (self, t):
+        signed = self.signed
+        a = self.amplitude
+        if callable(a):
+            # structure may vary
+            leaves, plan = _flatten(self.centre, a(t), self.threshold)
+        else:
+            leaves = self.leaves
+            plan = self.plan
+        rtn = []
+        for centre, amplitude, threshold in leaves:
             if not isinstance(centre, (int, float)):
-                return centre
-            if threshold is not None and abs(amplitude) <= threshold:
-                return None
-            val = amplitude * expovariate(1)
-            if signed:
-                val *= 2 * randrange(2) - 1
-            return centre + val
-
-        a = amplitude(t) if callable(amplitude) else amplitude
-        rtn = call_in_nest(interp_val, centre, a, threshold)
-        if _match_in_nest(rtn, None):
+                rtn.append(centre)
+            elif threshold is not None and abs(amplitude) <= threshold:
+                rtn.append(None)
+            else:
+                val = amplitude * expovariate(1)
+                if signed:
+                    val *= 2 * randrange(2) - 1
+                rtn.append(centre + val)
+        if all(v is None for v in rtn):
             # all done
-            rtn = None
-        return rtn
+            return None
+        return _unflatten(rtn, plan)
 
-    return get_val
+
+def _round_val (do, v):
+    """Round a number if ``do`` is true (for :func:`call_in_nest`)."""
+    return ir(v) if isinstance(v, (int, float)) and do else v
 
 
 def interp_round (get_val, do_round = True):
@@ -283,11 +377,8 @@ interp_round(get_val, round_val = True) -> f
 :return: the ``get_val`` wrapper that rounds the returned value.
 
 """
-    def round_val (do, v):
-        return ir(v) if isinstance(v, (int, float)) and do else v
-
     def round_get_val (t):
-        return call_in_nest(round_val, do_round, get_val(t))
+        return call_in_nest(_round_val, do_round, get_val(t))
 
     return round_get_val
 
@@ -343,6 +434,278 @@ journey' of the oscillation.
     return osc_get_val
 
 
+class _TweenGroup (object):
+    """Running interpolations evaluated together by :class:`Scheduler`.
+
+This evaluates each interpolation function separately; subclasses handle one
+kind of function (:attr:`kind`) and evaluate all of them at once, by
+implementing :meth:`_pack` and :meth:`_eval`.
+
+"""
+
+    #: The type of interpolation function handled, or ``None`` for any.
+    kind = None
+
+    def __init__ (self):
+        # tween ids and interpolation functions, one row each
+        self.ids = []
+        self.fns = []
+        # elapsed time and creation frame for each row
+        self.t = np.zeros(0)
+        self.created = np.zeros(0, int)
+        # (id, fn, created) for tweens not yet in the rows, and ids of those
+        # to remove from them
+        self._new = []
+        self._removed = set()
+
+    def add (self, i, fn, created):
+        """Add an interpolation function with tween id ``i``."""
+        self._new.append((i, fn, created))
+
+    def remove (self, i):
+        """Remove the interpolation with tween id ``i``."""
+        self._removed.add(i)
+
+    def _sync (self):
+        """Apply additions and removals to the rows."""
+        removed = self._removed
+        if removed:
+            keep = np.array([i not in removed for i in self.ids], bool)
+            self.ids = [i for i in self.ids if i not in removed]
+            self.fns = [f for f, k in zip(self.fns, keep) if k]
+            self.t = self.t[keep]
+            self.created = self.created[keep]
+            self._new = [new for new in self._new if new[0] not in removed]
+            removed.clear()
+        if self._new:
+            ids, fns, created = zip(*self._new)
+            self.ids += ids
+            self.fns += fns
+            self.t = np.concatenate((self.t, np.zeros(len(ids))))
+            self.created = np.concatenate((self.created, created))
+            self._new = []
+        self._pack()
+
+    def step (self, frame, n_frames):
+        """Advance interpolations by a frame.
+
+step(frame, n_frames) -> results
+
+:arg frame: the length of the frame in seconds.
+:arg n_frames: the current frame number; interpolations created in this frame
+               aren't advanced.
+
+:return: a list of ``(id, t, v)`` for each interpolation advanced, where ``t``
+         is its elapsed time and ``v`` is its interpolation function's value.
+
+"""
+        if self._new or self._removed:
+            self._sync()
+        if not self.ids:
+            return []
+        running = self.created < n_frames
+        self.t[running] += frame
+        rows = np.flatnonzero(running)
+        ids = self.ids
+        return zip([ids[r] for r in rows.tolist()], self.t[rows].tolist(),
+                   self._eval(rows))
+
+    def _pack (self):
+        """Build any arrays needed by :meth:`_eval` from the rows."""
+        pass
+
+    def _eval (self, rows):
+        """Get interpolation functions' values for the given rows (array)."""
+        fns = self.fns
+        return [fns[r](t) for r, t in zip(rows.tolist(),
+                                          self.t[rows].tolist())]
+
+    def _leaves (self, rows, starts):
+        """Find the leaves belonging to some rows.
+
+_leaves(rows, starts) -> (leaves, owners, bounds)
+
+:arg rows: an array of row indices.
+:arg starts: an array giving the index of each row's first leaf, and the total
+             number of leaves last.
+
+:return: an array of the indices of the rows' leaves, an array giving the
+         position in ``rows`` of each one's row, and an array of the
+         positions in ``leaves`` where each row's leaves start, and the number
+         of leaves last.
+
+"""
+        first = starts[rows]
+        lens = starts[rows + 1] - first
+        bounds = np.zeros(len(rows) + 1, int)
+        np.cumsum(lens, out = bounds[1:])
+        owners = np.repeat(np.arange(len(rows)), lens)
+        leaves = np.arange(bounds[-1]) - bounds[owners] + first[owners]
+        return (leaves, owners, bounds)
+
+
+class _LinearGroup (_TweenGroup):
+    """Evaluates :func:`interp_linear` functions together."""
+
+    kind = _Linear
+
+    def _pack (self):
+        fns = self.fns
+        n_ts = [len(f.ts) for f in fns]
+        # at least one segment, so rows without any can index one
+        n_max = max(n_ts + [2])
+        self.n_ts = np.array(n_ts, int)
+        # waypoint times, padded with infinity
+        self.ts = np.empty((len(fns), n_max))
+        self.ts.fill(np.inf)
+        # first value, change in value and whether the value is a number for
+        # each segment of each leaf
+        starts = [0]
+        segments = []
+        for r, f in enumerate(fns):
+            self.ts[r, :len(f.ts)] = f.ts
+            starts.append(starts[-1] + len(f.v0))
+            segments.append(zip(*f.segments) if f.segments else
+                            [()] * len(f.v0))
+        n_leaves = starts[-1]
+        self.starts = np.array(starts, int)
+        self.v = np.zeros((n_leaves, n_max - 1))
+        self.dv = np.zeros((n_leaves, n_max - 1))
+        self.is_num = np.zeros((n_leaves, n_max - 1), bool)
+        # whether each row has any non-numbers, which keep their first value
+        self.mixed = []
+        k = 0
+        for segs in segments:
+            mixed = False
+            for leaf in segs:
+                for j, seg in enumerate(leaf):
+                    if seg is None:
+                        mixed = True
+                    else:
+                        self.v[k, j], self.dv[k, j] = seg
+                        self.is_num[k, j] = True
+                k += 1
+            self.mixed.append(mixed)
+
+    def _eval (self, rows):
+        t = self.t[rows]
+        ts = self.ts[rows]
+        # get waypoints we're between (as bisect)
+        i = (ts <= t[:, None]).sum(1)
+        seg = np.clip(i - 1, 0, ts.shape[1] - 2)
+        t1 = ts[np.arange(len(rows)), seg]
+        t2 = ts[np.arange(len(rows)), seg + 1]
+        # ratio of the way between waypoints; meaningless for rows before the
+        # start or past the end
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            r = np.where(t2 == t1, 1, (t - t1) / (t2 - t1))
+        leaves, owners, bounds = self._leaves(rows, self.starts)
+        leaf_seg = seg[owners]
+        vs = (self.v[leaves, leaf_seg] +
+              r[owners] * self.dv[leaves, leaf_seg]).tolist()
+        is_num = self.is_num[leaves, leaf_seg]
+        fns = self.fns
+        n_ts = self.n_ts
+        mixed = self.mixed
+        bounds = bounds.tolist()
+        rtn = []
+        for j, (row, i) in enumerate(zip(rows.tolist(), i.tolist())):
+            f = fns[row]
+            if f._ended:
+                rtn.append(None)
+                continue
+            if i == 0:
+                # before start
+                v = list(f.v0)
+            elif i == n_ts[row]:
+                # past end: use final value, then end
+                f._ended = True
+                v = list(f.v_end)
+            else:
+                b0 = bounds[j]
+                v = vs[b0:bounds[j + 1]]
+                if mixed[row]:
+                    for k in np.flatnonzero(~is_num[b0:bounds[j + 1]]):
+                        v[k] = f.v0[k]
+            rtn.append(_unflatten(v, f.plan))
+        return rtn
+
+
+class _TargetGroup (_TweenGroup):
+    """Evaluates :func:`interp_target` functions together."""
+
+    kind = _Target
+
+    def _pack (self):
+        fns = self.fns
+        self.damp = np.array([f.damp for f in fns], float)
+        self.freq = np.array([f.freq for f in fns], float)
+        starts = [0]
+        amp = []
+        phase = []
+        target = []
+        # stopping distance, or -1 to never stop
+        threshold = []
+        # whether each leaf's value is a constant None, and (index, value) for
+        # each constant in each row
+        none = []
+        self.consts = []
+        for f in fns:
+            starts.append(starts[-1] + len(f.leaves))
+            consts = []
+            for k, (const, a, p, tgt, thr) in enumerate(f.leaves):
+                if a is None:
+                    consts.append((k, const))
+                    amp.append(0)
+                    phase.append(0)
+                    target.append(0)
+                    threshold.append(-1)
+                    none.append(const is None)
+                else:
+                    amp.append(a)
+                    phase.append(p)
+                    target.append(tgt)
+                    threshold.append(-1 if thr is None else thr)
+                    none.append(False)
+            self.consts.append(consts)
+        self.starts = np.array(starts, int)
+        self.amp = np.array(amp, float)
+        self.phase = np.array(phase, float)
+        self.target = np.array(target, float)
+        self.threshold = np.array(threshold, float)
+        self.none = np.array(none, bool)
+
+    def _eval (self, rows):
+        t = self.t[rows]
+        decay = np.exp(-self.damp[rows] * t)
+        leaves, owners, bounds = self._leaves(rows, self.starts)
+        dist = self.amp[leaves] * decay[owners]
+        vs = (dist * np.cos(self.freq[rows][owners] * t[owners] +
+                            self.phase[leaves]) +
+              self.target[leaves]).tolist()
+        stopped = np.abs(dist) <= self.threshold[leaves]
+        for k in np.flatnonzero(stopped).tolist():
+            vs[k] = None
+        # rows where every leaf is None are done
+        n_none = np.zeros(len(leaves) + 1, int)
+        np.cumsum(stopped | self.none[leaves], out = n_none[1:])
+        done = (n_none[bounds[1:]] - n_none[bounds[:-1]] ==
+                np.diff(bounds)).tolist()
+        fns = self.fns
+        consts = self.consts
+        bounds = bounds.tolist()
+        rtn = []
+        for j, row in enumerate(rows.tolist()):
+            if done[j]:
+                rtn.append(None)
+                continue
+            v = vs[bounds[j]:bounds[j + 1]]
+            for k, const in consts[row]:
+                v[k] = const
+            rtn.append(_unflatten(v, fns[row].plan))
+        return rtn
+
+
 class Timer (object):
     """Simple timer.
 
@@ -359,6 +722,50 @@ Timer(fps = 60)
         #: The amount of time in seconds that has elapsed since the start of
         #: the current call to :meth:`run`, if any.
         self.t = 0
+        #: Whether to wait between frames to keep to :attr:`fps`.  If
+        #: ``False``, frames are run as fast as possible, and each counts as
+        #: exactly one frame of time passing.
+        self.throttle = True
+        #: Real time in seconds taken by the callback in the last frame (in
+        #: fixed-timestep mode, by the last batch of steps and :attr:`render`).
+        self.busy_time = 0
+        #: Real time in seconds spent waiting after the last frame (in
+        #: fixed-timestep mode, since the last batch of steps).
+        self.sleep_time = 0
+        #: The number of times the callback was called in the last frame;
+        #: more than ``1`` only in fixed-timestep mode.
+        self.n_steps = 1
+        #: While the callback is running, the number of times it was already
+        #: called since the last frame was rendered; always ``0`` unless in
+        #: fixed-timestep mode.  Per-frame work can check this is ``0``.
+        self.step = 0
+        #: When waiting for the next frame, stop sleeping this many seconds
+        #: early and spin until the frame is due, since sleeping is only
+        #: accurate to a millisecond or so at best.  Defaults to
+        #: :data:`conf.FRAME_SPIN_TIME`.
+        self.spin_time = conf.FRAME_SPIN_TIME
+        #: The difference in seconds between the real and target length of
+        #: recent frames (up to 600), oldest first, when throttling; see
+        #: :meth:`jitter`.
+        self.intervals = deque(maxlen = 600)
+        #: Whether to run in fixed-timestep mode: the callback is a simulation
+        #: step, called as many times as needed (up to :attr:`max_steps`) to
+        #: keep up with real time, and :attr:`render` is called once after
+        #: each batch of steps.
+        self.fixed_step = False
+        #: In fixed-timestep mode, the most steps to run before rendering; if
+        #: still behind after this many, the remaining time is dropped (so the
+        #: game slows down).  Defaults to :data:`conf.MAX_STEPS_PER_FRAME`.
+        self.max_steps = conf.MAX_STEPS_PER_FRAME
+        #: In fixed-timestep mode, a function to call without arguments after
+        #: running steps, or ``None``.
+        self.render = None
+        #: In fixed-timestep mode, the proportion of a step's worth of time
+        #: that has passed since the last step, when :attr:`render` is called.
+        #: Drawing should show things this far between their states at the
+        #: last two steps, so that motion is smooth when steps and drawing
+        #: happen at different rates.
+        self.alpha = 0
 
     @property
     def fps (self):
@@ -383,8 +790,11 @@ run(cb, *args[, seconds][, frames]) -> remain
              can be a float.  Ignored if ``seconds`` is passed.
 
 If neither ``seconds`` nor ``frames`` is given, run forever (until :meth:`stop`
-is called).  Time passed is based on the number of frames that have passed, so
-it does not necessarily reflect real time.
+is called).  If :attr:`throttle` is ``True``, ``seconds`` counts real time;
+otherwise, each frame counts as exactly one frame of time.  ``frames`` counts
+frames that ran, or would have if a long frame had not delayed them.  In
+fixed-timestep mode (see :attr:`fixed_step`), a frame is one
+simulation step.
 
 :return: the number of seconds/frames left until the timer has been running for
          the requested amount of time (or ``None``, if neither were given).
@@ -399,13 +809,24 @@ it does not necessarily reflect real time.
             seconds = max(seconds, 0)
         elif frames is not None:
             frames = max(frames, 0)
+        self.step = 0
+        self.n_steps = 1
+        if self.fixed_step:
+            return self._run_fixed(cb, args, seconds, frames)
         # main loop
-        t0 = time()
+        t0 = time() # when the current frame was due to start
         while 1:
             frame = self.frame
+            t_start = time()
             cb(*args)
             t = time()
-            t_gone = min(t - t0, frame)
+            self.busy_time = t - t_start
+            self.sleep_time = 0
+            if self.throttle:
+                t_gone = min(t - t0, frame)
+            else:
+                # fixed timestep: don't wait, and don't lose part-frames
+                t_gone = frame
             if self._stopped:
                 if seconds is not None:
                     return seconds - t_gone
@@ -413,19 +834,31 @@ it does not necessarily reflect real time.
                     return frames - t_gone / frame
                 else:
                     return None
-            t_left = frame - t_gone # until next frame
+            t_wait = t_left = frame - t_gone # until next frame
             if seconds is not None:
                 t_left = min(seconds, t_left)
             elif frames is not None:
-                t_left = min(frames, t_left / frame)
+                t_left = min(frames * frame, t_left)
             if t_left > 0:
-                wait(int(1000 * t_left))
-                t0 = t + t_left
+                # wait for the deadline rather than a duration, so that time
+                # spent outside the callback doesn't push frames back
+                t0 += t_gone + t_left
+                idled = self._wait_until(t0)
+                t_end = time()
+                self.sleep_time = t_end - t
             else:
-                t0 = t
-            self.t += frame
+                idled = False
+                t0 = t_end = t
+            if self.throttle:
+                dt = t_end - t_start
+                if t_left == t_wait and not idled:
+                    # wasn't cut short
+                    self.intervals.append(dt - frame)
+            else:
+                dt = frame
+            self.t += dt
             if seconds is not None:
-                seconds -= t_gone + t_left
+                seconds -= dt
                 if seconds <= 0:
                     return seconds
             elif frames is not None:
@@ -433,6 +866,103 @@ it does not necessarily reflect real time.
                 if frames <= 0:
                     return frames
 
+    def _run_fixed (self, cb, args, seconds, frames):
+        """:meth:`run` in fixed-timestep mode."""
+        # real time not yet simulated; start with a step
+        acc = self.frame
+        t_last = time()
+        while 1:
+            t_start = time()
+            frame = self.frame
+            if self.throttle:
+                acc += t_start - t_last
+                if self.t:
+                    self.intervals.append(t_start - t_last - frame)
+            else:
+                # exactly one step each time
+                acc = frame
+            t_last = t_start
+            steps = 0
+            done = False
+            while acc >= frame and steps < self.max_steps:
+                self.step = steps
+                cb(*args)
+                if self._stopped:
+                    if seconds is not None:
+                        return seconds - frame
+                    elif frames is not None:
+                        return frames - 1
+                    else:
+                        return None
+                acc -= frame
+                steps += 1
+                self.t += frame
+                if seconds is not None:
+                    seconds -= frame
+                    done = seconds <= 0
+                elif frames is not None:
+                    frames -= 1
+                    done = frames <= 0
+                if done:
+                    break
+                frame = self.frame
+            if acc >= frame and not done:
+                # too far behind: drop time rather than trying to catch up
+                acc %= frame
+            if steps:
+                self.alpha = acc / frame
+                if self.render is not None:
+                    self.render()
+            t = time()
+            if steps:
+                # timings cover a batch of steps and the time until the next
+                self.busy_time = t - t_start
+                self.sleep_time = 0
+                self.n_steps = steps
+            if done:
+                return seconds if seconds is not None else frames
+            # wait until the next step is due
+            t_left = frame - acc - (t - t_start)
+            if self.throttle and t_left > 0:
+                if self._wait_until(t + t_left):
+                    # don't try to catch up on time spent idle
+                    acc = frame
+                    t_last = time()
+                self.sleep_time += time() - t
+
+    def _wait_until (self, deadline):
+        """Sleep, then spin, until the given time (as returned by time()).
+
+Returns whether the wait went on past the deadline because there was nothing to
+do (always ``False`` for :class:`Timer`).
+
+"""
+        t_sleep = deadline - time() - self.spin_time
+        if t_sleep >= .001:
+            wait(int(1000 * t_sleep))
+        while time() < deadline:
+            pass
+        return False
+
+    def jitter (self):
+        """Summarise how consistently recent frames kept to :attr:`fps`.
+
+jitter() -> (mean, sd, worst)
+
+:return: the mean and standard deviation of the difference in seconds between
+         the real and target length of recent frames, and the largest absolute
+         difference.  All are ``0`` if no frames were recorded (see
+         :attr:`intervals`).
+
+"""
+        ds = self.intervals
+        n = len(ds)
+        if not n:
+            return (0, 0, 0)
+        mean = sum(ds) / n
+        sd = (sum((d - mean) ** 2 for d in ds) / n) ** .5
+        return (mean, sd, max(abs(d) for d in ds))
+
     def stop (self):
         """Stop the current call to :meth:`run`, if any."""
         self._stopped = True
@@ -445,12 +975,94 @@ Scheduler(fps = 60)
 
 :arg fps: frames per second to aim for.
 
+Timeouts are kept in priority queues ordered by the time or frame they're due,
+so each frame only costs as much as the timeouts that are called.
+
+If :attr:`fps_range` is set, the scheduler governs its own frame rate: each
+frame, :attr:`fps` is lowered if the last frame was busy for too much of its
+length, or (if :attr:`lower_when_inactive`) didn't change anything, and raised
+again if there's time to spare.
+
+If :attr:`idle` is set and returns ``True`` when it's time to wait for the next
+frame, the scheduler instead blocks until an event arrives or the next timeout
+that isn't passive (see :meth:`add_timeout`) is due, and skips the time that
+passed.  Frames don't pass while blocking, so timeouts measured in frames keep
+the scheduler awake.
+
+If :attr:`paused` is ``True``, no frames run at all: the scheduler blocks until
+a ``pygame.ACTIVEEVENT``, ``pygame.QUIT`` or :attr:`wake_event` arrives (keeping
+other events for when it wakes), and no time passes for timeouts.
+
 """
 
+    # _TweenGroup subclass for each kind of interpolation function
+    _group_types = dict((cls.kind, cls) for cls in (
+        _TweenGroup, _LinearGroup, _TargetGroup
+    ))
+
     def __init__ (self, fps = 60):
         Timer.__init__(self, fps)
+        #: ``(min, max)`` frame rates the governor may choose between, or
+        #: ``None`` to keep :attr:`fps` as set.
+        self.fps_range = None
+        #: ``(low, high)`` proportion of a frame spent busy below which the
+        #: governor raises the frame rate, and above which it lowers it.
+        #: Defaults to :data:`conf.FPS_LOAD`.
+        self.load_range = conf.FPS_LOAD
+        #: ``(raise, lower)`` factors the governor changes the frame rate by
+        #: in one frame.  Defaults to :data:`conf.FPS_STEP`.
+        self.fps_step = conf.FPS_STEP
+        #: Whether the governor should lower the frame rate when
+        #: :attr:`frame_active` is ``False``.
+        self.lower_when_inactive = False
+        #: Whether the last frame changed anything; set this to ``False`` to
+        #: tell the governor frames could be dropped.
+        self.frame_active = True
+        self._governed_fps = None
+        #: A function called without arguments before waiting for the next
+        #: frame, returning whether there is nothing to do until an event
+        #: arrives or a timeout is due; or ``None``.
+        self.idle = None
+        #: Whether to stop running frames until an event arrives that might
+        #: change this (see above).
+        self.paused = False
+        #: The Pygame event type used to wake up after blocking.  Defaults to
+        #: :data:`conf.EVENT_WAKE`.
+        self.wake_event = conf.EVENT_WAKE
+        # ids of passive timeouts
+        self._passive = set()
+        # {id: [due_seconds, due_frames, repeat_seconds, repeat_frames, cb,
+        #       args]}, where exactly one of the due times is not None
         self._cbs = {}
         self._max_id = 0
+        # time and number of frames handled by _update so far
+        self._elapsed = 0
+        self._n_frames = 0
+        # heaps of (due, id) for timeouts in seconds and in frames, then for
+        # passive timeouts in seconds and in frames; these may contain entries
+        # for removed timeouts
+        self._queues = ([], [], [], [])
+        self._n_removed = 0
+        # ids of timeouts taken from the queues to be called this frame and
+        # not yet put back
+        self._popped = set()
+        # {id: tween} for running interpolations (see interp)
+        self._tweens = {}
+        # {kind: group} for running interpolations, where kind is a
+        # _TweenGroup.kind
+        self._tween_groups = {}
+        # timeout that steps all interpolations
+        self._tween_step_id = None
+
+    @property
+    def elapsed (self):
+        """The time in seconds handled so far, including the current frame.
+
+Timeouts in seconds are due relative to this; it advances by :attr:`frame` each
+frame (and by any time skipped while idle).
+
+"""
+        return self._elapsed
 
     def run (self, seconds = None, frames = None):
         """Start the scheduler.
@@ -466,8 +1078,8 @@ Arguments and return value are as for :meth:`Timer.run`.
     def add_timeout (self, cb, *args, **kwargs):
         """Call a function after a delay.
 
-add_timeout(cb, *args[, seconds][, frames][, repeat_seconds][, repeat_frames])
-            -> ident
+add_timeout(cb, *args[, seconds][, frames][, repeat_seconds][, repeat_frames],
+            passive = False) -> ident
 
 :arg cb: the function to call.
 :arg args: list of arguments to pass to cb.
@@ -481,6 +1093,8 @@ add_timeout(cb, *args[, seconds][, frames][, repeat_seconds][, repeat_frames])
                      initial time delay is used between calls.
 :arg repeat_frames: how long to wait between calls, in frames (like
                     ``repeat_seconds``).
+:arg passive: if ``True``, this timeout doesn't need to be called on time if
+              nothing else is happening (see :attr:`idle`).
 
 :return: a timeout identifier to pass to :meth:`rm_timeout`.  This is
          guaranteed to be unique over time.
@@ -503,45 +1117,192 @@ will not be called again.
         elif repeat_frames is None:
             repeat_seconds = seconds
             repeat_frames = frames
-        self._cbs[self._max_id] = [seconds, frames, repeat_seconds,
-                                   repeat_frames, cb, args]
+        i = self._max_id
         self._max_id += 1
+        # store due time/frame
+        if seconds is not None:
+            data = [self._elapsed + seconds, None]
+        else:
+            data = [None, self._n_frames + frames]
+        mode = frames is not None
+        self._cbs[i] = data + [repeat_seconds, repeat_frames, cb, args]
+        if kwargs.get('passive'):
+            self._passive.add(i)
+        heappush(self._queue(i, mode), (data[mode], i))
         # ID is key in self._cbs
-        return self._max_id - 1
+        return i
 
     def rm_timeout (self, *ids):
         """Remove the timeouts with the given identifiers."""
+        cbs = self._cbs
+        tweens = self._tweens
         for i in ids:
-            try:
-                del self._cbs[i]
-            except KeyError:
-                pass
+            if i in tweens:
+                tweens.pop(i)[2].remove(i)
+            elif cbs.pop(i, None) is not None:
+                if i not in self._popped:
+                    # its entry is left in a queue
+                    self._n_removed += 1
+                self._passive.discard(i)
+
+    def _queue (self, i, mode):
+        """Get the queue a timeout belongs in (``mode`` is as in _cbs)."""
+        return self._queues[mode + 2 * (i in self._passive)]
+
+    def _rebuild_queues (self):
+        """Rebuild the timeout queues without removed timeouts."""
+        queues = ([], [], [], [])
+        passive = self._passive
+        for i, data in self._cbs.iteritems():
+            mode = data[0] is None
+            queues[mode + 2 * (i in passive)].append((data[mode], i))
+        for q in queues:
+            heapify(q)
+        self._queues = queues
+        self._n_removed = 0
+
+    def _next_due (self):
+        """Get the time until the next timeout that isn't passive is due.
+
+_next_due() -> t
+
+:return: the time in seconds, ``0`` if there is such a timeout measured in
+         frames, or ``None`` if there are none.
+
+"""
+        cbs = self._cbs
+        queues = self._queues
+        for mode in (1, 0):
+            q = queues[mode]
+            # drop removed timeouts from the front
+            while q and q[0][1] not in cbs:
+                heappop(q)
+                self._n_removed -= 1
+            if q:
+                return 0 if mode else max(q[0][0] - self._elapsed, 0)
+        return None
+
+    def _wait_event (self, t = None):
+        """Block until an event arrives, or for ``t`` seconds if given."""
+        wake = self.wake_event
+        if t is not None:
+            pg.time.set_timer(wake, int(1000 * t))
+        evt = pg.event.wait()
+        if t is not None:
+            pg.time.set_timer(wake, 0)
+        pg.event.clear(wake)
+        if evt.type not in (wake, pg.NOEVENT):
+            # leave it for the event handler
+            pg.event.post(evt)
+
+    def _wait_paused (self):
+        """Block until an event arrives that might end a pause."""
+        wake = self.wake_event
+        ends = (wake, pg.ACTIVEEVENT, pg.QUIT, pg.NOEVENT)
+        held = []
+        while 1:
+            evt = pg.event.wait()
+            if evt.type in ends:
+                break
+            held.append(evt)
+        if evt.type not in (wake, pg.NOEVENT):
+            held.append(evt)
+        # leave them for the event handler
+        for evt in held:
+            pg.event.post(evt)
+
+    def _wait_until (self, deadline):
+        if self.paused:
+            Timer._wait_until(self, deadline)
+            # time stands still until something might unpause
+            self._wait_paused()
+            return True
+        if self.idle is None or not self.idle():
+            return Timer._wait_until(self, deadline)
+        t = self._next_due()
+        if t is not None:
+            # the next frame adds its own length to the elapsed time
+            t = max(t - self.frame, 0)
+            if t < self.frame:
+                return Timer._wait_until(self, deadline)
+        Timer._wait_until(self, deadline)
+        # wait for an event, or until the timeout is due
+        self._wait_event(t)
+        # skip the time spent blocking
+        self._elapsed += time() - deadline
+        return True
+
+    def _govern (self):
+        """Adjust :attr:`fps` within :attr:`fps_range` for the last frame."""
+        fps_min, fps_max = self.fps_range
+        load = self.busy_time / (self.frame * self.n_steps)
+        low, high = self.load_range
+        up, down = self.fps_step
+        fps = self._governed_fps
+        if fps is None:
+            fps = self.fps
+        if load > high or (self.lower_when_inactive and
+                           not self.frame_active):
+            fps /= down
+        elif load < low:
+            fps *= up
+        fps = min(max(fps, fps_min), fps_max)
+        # keep the unrounded value so that small steps accumulate
+        self._governed_fps = fps
+        if abs(1. / fps - self.frame) > 10 ** -9:
+            self.fps = fps
 
     def _update (self):
         """Handle callbacks this frame."""
+        if self.fps_range is not None and not self.step:
+            # once for each rendered frame
+            self._govern()
+        self._elapsed += self.frame
+        self._n_frames += 1
         cbs = self._cbs
-        frame = self.frame
-        # cbs might add/remove cbs, so use items instead of iteritems
-        for i, data in cbs.items():
-            if i not in cbs:
-                # removed since we called .items()
+        queues = self._queues
+        # find due timeouts first, so those added by callbacks wait until the
+        # next frame; allow for rounding error in summing frame times
+        due = []
+        nows = (self._elapsed + 10 ** -9, self._n_frames)
+        for q, now in zip(queues, nows * 2):
+            while q and q[0][0] <= now:
+                i = heappop(q)[1]
+                if i in cbs:
+                    due.append(i)
+                else:
+                    self._n_removed -= 1
+        # call in the order they were added
+        due.sort()
+        popped = self._popped
+        popped.update(due)
+        for i in due:
+            data = cbs.get(i)
+            if data is None:
+                # removed by an earlier callback
                 continue
-            if data[0] is not None:
-                remain = 0
-                dt = frame
-            else:
-                remain = 1
-                dt = 1
-            data[remain] -= dt
-            if data[remain] <= 0:
-                # call callback
-                if data[4](*data[5]):
-                    # add on delay
-                    total = 0 if data[2] is not None else 1
-                    data[not total] = None
-                    data[total] += data[total + 2]
-                elif i in cbs: # else removed in above call
-                    del cbs[i]
+            # call callback
+            if data[4](*data[5]):
+                if i not in cbs:
+                    # removed in the above call
+                    continue
+                # add on delay, carrying over part-frames
+                mode = data[2] is None
+                if data[mode] is None:
+                    # switching between seconds and frames
+                    data[not mode] = None
+                    data[mode] = (self._elapsed, self._n_frames)[mode]
+                data[mode] += data[mode + 2]
+                heappush(self._queue(i, mode), (data[mode], i))
+                popped.discard(i)
+            elif i in cbs: # else removed in above call
+                del cbs[i]
+                self._passive.discard(i)
+        popped.clear()
+        # removed timeouts are left in the queues until they're due; clean up
+        # if they're mostly stale
+        if self._n_removed > max(len(cbs), 64):
+            self._rebuild_queues()
 
     def interp (self, get_val, set_val, t_max = None, val_min = None,
                 val_max = None, end = None, round_val = False, multi_arg = False):
@@ -578,51 +1339,87 @@ interp(get_val, set_val[, t_max][, val_min][, val_max][, end],
         callback that continues the interpolation.  In this case ``end`` is not
         respected.
 
+All running interpolations are advanced together by a single timeout each
+frame, starting the frame after they're created.  Those using the functions
+returned by :func:`interp_linear` and :func:`interp_target` directly are
+evaluated in batches, one for each kind.  ``set_val`` is only called when the
+value changes.
+
 """
-        if round_val:
-            get_val = interp_round(get_val, round_val)
         if not callable(set_val):
             obj, attr = set_val
             set_val = lambda val: setattr(obj, attr, val)
-
-        def timeout_cb ():
-            t = 0
-            last_v = None
+        i = self._max_id
+        self._max_id += 1
+        kind = type(get_val)
+        if kind not in self._group_types:
+            kind = None
+        group = self._tween_groups.get(kind)
+        if group is None:
+            group = self._tween_groups[kind] = self._group_types[kind]()
+        group.add(i, get_val, self._n_frames)
+        self._tweens[i] = [
+            get_val, set_val, group, None, t_max, val_min, val_max, end,
+            round_val, multi_arg
+        ]
+        if self._tween_step_id is None:
+            self._tween_step_id = self.add_timeout(self._step_tweens,
+                                                   frames = 1)
+        return i
+
+    def _step_tweens (self):
+        """Advance running interpolations by a frame."""
+        frame = self.frame
+        n_frames = self._n_frames
+        tweens = self._tweens
+        # get values a group at a time, then handle them in the order the
+        # interpolations were created
+        results = []
+        for group in self._tween_groups.itervalues():
+            results += group.step(frame, n_frames)
+        results.sort()
+        for i, t, v in results:
+            tween = tweens.get(i)
+            if tween is None:
+                # removed by an earlier callback
+                continue
+            (get_val, set_val, group, last_v, t_max, val_min, val_max, end,
+             round_val, multi_arg) = tween
             done = False
-            while 1:
-                t += self.frame
-                v = get_val(t)
-                if v is None:
+            if v is None:
+                done = True
+            # check bounds
+            elif t_max is not None and t > t_max:
+                done = True
+            else:
+                if round_val:
+                    v = call_in_nest(_round_val, round_val, v)
+                if val_min is not None and v < val_min:
                     done = True
-                # check bounds
-                elif t_max is not None and t > t_max:
+                    v = val_min
+                elif val_max is not None and v > val_max:
                     done = True
+                    v = val_max
+                # only set changed values
+                if v != last_v:
+                    set_val(*v) if multi_arg else set_val(v)
+                    tween[3] = last_v = v
+            if done:
+                # canceling for some reason
+                del tweens[i]
+                group.remove(i)
+                if callable(end):
+                    v = end()
                 else:
-                    if val_min is not None and v < val_min:
-                        done = True
-                        v = val_min
-                    elif val_max is not None and v > val_max:
-                        done = True
-                        v = val_max
-                    if v != last_v:
-                        set_val(*v) if multi_arg else set_val(v)
-                        last_v = v
-                if done:
-                    # canceling for some reason
-                    if callable(end):
-                        v = end()
-                    else:
-                        v = end
-                    # set final value if want to
-                    if v is not None and v != last_v:
-                        set_val(*v) if multi_arg else set_val(v)
-                    yield False
-                    # just in case we get called again (should never happen)
-                    return
-                else:
-                    yield True
-
-        return self.add_timeout(timeout_cb().next, frames = 1)
+                    v = end
+                # set final value if want to
+                if v is not None and v != last_v:
+                    set_val(*v) if multi_arg else set_val(v)
+        if tweens:
+            return True
+        else:
+            self._tween_step_id = None
+            return False
 
     def interp_simple (self, obj, attr, target, t, end_cb = None,
                        round_val = False):
@@ -648,4 +1445,5 @@ interp_simple(obj, attr, target, t[, end_cb], round_val = False) -> timeout_id
 
 """
         get_val = interp_linear(getattr(obj, attr), (target, t))
-        self.interp(get_val, (obj, attr), end = end_cb, round_val = round_val)
+        return self.interp(get_val, (obj, attr), end = end_cb,
+                           round_val = round_val)
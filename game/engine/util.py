@@ -7,7 +7,8 @@ from bisect import bisect
 import pygame as pg
 
 __all__ = ('dd', 'ir', 'sum_pos', 'randsgn', 'rand0', 'weighted_rand',
-           'position_sfc', 'convert_sfc', 'combine_drawn', 'blank_sfc')
+           'position_sfc', 'convert_sfc', 'combine_drawn', 'coalesce_rects',
+           'merge_runs', 'blank_sfc')
 
 
 # abstract
@@ -148,6 +149,83 @@ def combine_drawn (*drawn):
     return rects if rects else False
 
 
+def coalesce_rects (rects, rect_cost, pixel_cost, size = None, window = 16,
+                    passes = 3):
+    """Merge rects where updating fewer, bigger rects is estimated to be faster.
+
+coalesce_rects(rects, rect_cost, pixel_cost[, size], window = 16, passes = 3)
+    -> drawn
+
+:arg rects: a list of ``pygame.Rect`` instances (not modified).
+:arg rect_cost: the estimated fixed cost of updating a rect, in any unit.
+:arg pixel_cost: the estimated cost of updating each pixel, in the same unit.
+:arg size: the ``(width, height)`` of the area containing the rects.
+:arg window: each rect is compared with this many of the merged rects nearest
+             it in a top-to-bottom ordering.
+:arg passes: the maximum number of times to go through the rects.
+
+:return: ``True`` if ``size`` is given and updating the whole area is estimated
+         to be cheapest, else a list of rects covering at least the given
+         rects.
+
+Two rects are merged into their bounding rect if the pixels it adds cost less
+than updating a rect.
+
+"""
+    # extra pixels worth updating to save a rect
+    waste = float(rect_cost) / pixel_cost if pixel_cost > 0 else 0
+    rs = sorted((pg.Rect(r) for r in rects), key = lambda r: (r.top, r.left))
+    for i in xrange(passes):
+        merged = []
+        changed = False
+        for r in rs:
+            area = r.w * r.h
+            for j in xrange(len(merged) - 1,
+                            max(len(merged) - window, 0) - 1, -1):
+                m = merged[j]
+                u = m.union(r)
+                if u.w * u.h - m.w * m.h - area < waste:
+                    merged[j] = u
+                    changed = True
+                    break
+            else:
+                merged.append(r)
+        rs = merged
+        if not changed:
+            break
+    if size is not None:
+        w, h = size
+        cost = len(rs) * rect_cost + sum(r.w * r.h for r in rs) * pixel_cost
+        if cost >= rect_cost + w * h * pixel_cost:
+            return True
+    return rs
+
+
+def merge_runs (runs):
+    """Merge runs of cells in rows into rects.
+
+merge_runs(runs) -> rects
+
+:arg runs: ``{(x0, x1): ys}``, where each run covers columns ``x0`` up to but
+           not including ``x1`` in every row in the list ``ys``.
+
+:return: a list of ``(x, y, w, h)`` rects in cells, each covering runs with the
+         same columns in adjacent rows.
+
+"""
+    rects = []
+    for (x0, x1), ys in runs.iteritems():
+        ys = sorted(ys)
+        y0 = last = ys[0]
+        for y in ys[1:]:
+            if y != last + 1:
+                rects.append((x0, y0, x1 - x0, last + 1 - y0))
+                y0 = y
+            last = y
+        rects.append((x0, y0, x1 - x0, last + 1 - y0))
+    return rects
+
+
 def blank_sfc (size):
     """Create a transparent surface with the given ``(width, height)`` size."""
     sfc = pg.Surface(size).convert_alpha()
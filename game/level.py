@@ -1,14 +1,17 @@
-from math import cos, sin, pi, ceil
-from random import expovariate, uniform
+from math import pi, ceil
 
+import numpy as np
 import pygame as pg
 
 from engine import eh, conf, gm
 from engine.game import World
-from engine.util import ir, randsgn
+from engine.util import ir, merge_runs
 
 
 class Canvas (gm.Graphic):
+    # grid value for unpainted tiles
+    UNPAINTED = -1
+
     def __init__ (self, world):
         self.world = world
         self.scores = [0, 0]
@@ -18,138 +21,313 @@ class Canvas (gm.Graphic):
         self.ntiles = w * h
         self.trect = pg.Rect(1, 1, w, h)
         r = world.tile_rect(*self.trect)
-        self.grid = [[None for y in xrange(h)] for x in xrange(w)]
+        # grid[x - 1, y - 1] is the player owning tile (x, y), or UNPAINTED
+        self.grid = np.empty((w, h), dtype = np.int8)
+        self.grid.fill(self.UNPAINTED)
+        # {(x, y): ident} for tiles painted but not yet drawn
+        self._queued = {}
+        # players who gained tiles since the last flush
+        self._changed = set()
         sfc = pg.Surface(r[2:])
         self.img = conf.GAME.img('canvas.png')
         sfc.blit(self.img, (0, 0))
+        # the whole canvas painted by each player, to copy tiles from
+        self.tinted = []
+        tint = pg.Surface(r[2:]).convert_alpha()
+        for c in conf.PLAYER_COLOURS:
+            tinted = pg.Surface(r[2:]).convert()
+            tinted.blit(self.img, (0, 0))
+            tint.fill(c + (200,))
+            tinted.blit(tint, (0, 0))
+            self.tinted.append(tinted)
         gm.Graphic.__init__(self, sfc, r[:2], conf.LAYERS['canvas'])
 
     def get_at (self, x, y):
         if not self.trect.collidepoint(x, y):
             return None
-        else:
-            return self.grid[x - 1][y - 1]
+        i = self.grid[x - 1, y - 1]
+        return None if i == self.UNPAINTED else int(i)
+
+    def counts (self):
+        # number of tiles owned by each player, counted from the grid
+        n = len(self.scores)
+        return np.bincount(self.grid.ravel() + 1, minlength = n + 1)[1:]
+
+    def line_counts (self, axis):
+        # tiles owned by each player in each column (axis 0) or row (axis 1),
+        # as an array indexed by [line, player]
+        grid = self.grid if axis == 0 else self.grid.T
+        n_lines = grid.shape[0]
+        n = len(self.scores) + 1
+        # count (line, owner) pairs together, with unpainted tiles first
+        pairs = np.arange(n_lines)[:, None] * n + grid + 1
+        counts = np.bincount(pairs.ravel(), minlength = n_lines * n)
+        return counts.reshape(n_lines, n)[:, 1:]
+
+    def fraction_painted (self):
+        return float(np.count_nonzero(self.grid != self.UNPAINTED)) / \
+               self.ntiles
 
     def paint (self, ident, x, y):
         if not self.trect.collidepoint(x, y):
             return False
-        old = self.grid[x - 1][y - 1]
+        if self.grid[x - 1, y - 1] != ident:
+            self.grid[x - 1, y - 1] = ident
+            self._changed.add(ident)
+        # scores, drawing, sounds and the score meter wait for flush
+        self._queued[(x, y)] = ident
+        if not conf.BATCH_PAINT:
+            self.flush()
+        return True
+
+    def flush (self):
+        # draw tiles painted since the last call
+        queued = self._queued
+        if not queued:
+            return
+        self._queued = {}
+        changed = self._changed
+        self._changed = set()
+        if changed:
+            self.scores = self.counts().tolist()
+        scores = self.scores
         sfc = self.sfc_before_transform(self.transforms[0])
-        if old != ident:
-            scores = self.scores
-            if old is not None:
-                scores[old] -= 1
-            scores[ident] += 1
-            level = float(scores[0]) / sum(scores)
-            if sum(scores) == self.ntiles:
-                sfc.blit(self.img, (0, 0))
-                imgs = (self.world.bg.snapshot(), self.snapshot(),
-                        self.world.score.snapshot())
-                conf.GAME.switch_world(PostGame, imgs, scores)
-                return
-            else:
-                conf.GAME.play_snd('p{0}point'.format(ident + 1))
-            self.world.score.set_level(level)
-            self.grid[x - 1][y - 1] = ident
+        if changed and sum(scores) == self.ntiles:
+            sfc.blit(self.img, (0, 0))
+            imgs = (self.world.bg.snapshot(), self.snapshot(),
+                    self.world.score.snapshot())
+            conf.GAME.switch_world(PostGame, imgs, scores)
+            return
+        for ident in changed:
+            conf.GAME.play_snd('p{0}point'.format(ident + 1))
+        if changed:
+            self.world.score.set_level(float(scores[0]) / sum(scores))
+        rows = {}
+        for (x, y), ident in queued.iteritems():
+            rows.setdefault(y, []).append((x, ident))
+        tinted = self.tinted
         s = self.world.tile_size
-        r = ((x - 1) * s, (y - 1) * s, s, s)
-        sfc.blit(self.img, r, r)
-        csfc = pg.Surface((s, s)).convert_alpha()
-        csfc.fill(conf.PLAYER_COLOURS[ident] + (200,))
-        sfc.blit(csfc, r)
-        self._dirty.append(pg.Rect(self.world.tile_rect(x, y, 1, 1)))
-        return True
+        tile_rect = self.world.tile_rect
+        # a dirty grid gets the cells covered by runs of adjacent tiles in
+        # rows marked directly; otherwise runs are merged into rects first
+        graphics = self.world.graphics
+        to_grid = graphics.dirty_grid is not None
+        marked = []
+        # {(x0, x1): ys} for runs of adjacent tiles in rows
+        runs = {}
+        for y, tiles in rows.iteritems():
+            tiles.sort()
+            tiles.append((None, None))
+            # blit each span of one colour, and find runs of any colour
+            x0, ident0 = tiles[0]
+            run_x0 = last = x0
+            for x, ident in tiles[1:]:
+                adjacent = x == last + 1
+                if not adjacent or ident != ident0:
+                    r = ((x0 - 1) * s, (y - 1) * s, (last + 1 - x0) * s, s)
+                    sfc.blit(tinted[ident0], r, r)
+                    x0, ident0 = x, ident
+                if not adjacent:
+                    if to_grid:
+                        marked.append(tile_rect(run_x0, y, last + 1 - run_x0,
+                                                1))
+                    else:
+                        runs.setdefault((run_x0, last + 1), []).append(y)
+                    run_x0 = x
+                last = x
+        if marked:
+            graphics.dirty(*marked)
+        for r in merge_runs(runs):
+            self._dirty.append(pg.Rect(tile_rect(*r)))
 
 
 class Particles (gm.Graphic):
-    def __init__ (self, pos, colours, volume, size, speed, accn, life):
+    # per-pixel attributes: (name, dtype, shape)
+    fields = (
+        ('colour', int, (3,)), ('alpha', int, ()), ('life', float, ()),
+        ('accn', float, ()), ('speed', float, ()), ('cos', float, ()),
+        ('sin', float, ()), ('dx', int, ()), ('dy', int, ()),
+        ('fade_t', float, ()), ('x0', float, ()), ('y0', float, ()),
+        ('vx', float, ()), ('vy', float, ()), ('t0', float, ()),
+        ('burst', int, ()), ('ptcl', int, ())
+    )
+
+    def __init__ (self, world):
+        # a layer covering the screen that all bursts are drawn to
+        self.world = world
         self.t = 0
+        # number of pixels in use in the pool, which is the first self.n
+        # items of each array in self.ptcls
+        self.n = 0
+        self._n_bursts = 0
+        self._n_ptcls = 0
+        self.ptcls = {}
+        self._alloc(conf.PARTICLE_POOL_SIZE)
+        # rects drawn in during the last update
+        self._drawn = []
+        sfc = pg.Surface(conf.RES).convert_alpha()
+        sfc.fill((0, 0, 0, 0))
+        self.sfc = sfc
+        gm.Graphic.__init__(self, sfc, (0, 0), conf.LAYERS['particles'])
+
+    def _alloc (self, size):
+        n = self.n
+        old = self.ptcls
+        self.ptcls = ptcls = {}
+        for name, dtype, shape in self.fields:
+            ptcls[name] = a = np.empty((size,) + shape, dtype)
+            if n:
+                a[:n] = old[name][:n]
+
+    def add (self, pos, vel, colours, volume, size, speed, accn, life):
         # size, speed, accn are (mean, spread), spread mean distance from mean
         rand = self.rand
-        self.ptcls = ptcls = []
         norm = sum(ratio for c, ratio in colours)
         # generate particles
-        maxs = []
+        params = []
         for c, ratio in colours:
-            cvol = ir(float(volume) / norm)
-            cptcls = []
+            cvol = max(ir(float(volume) / norm), 0)
             c = list(c)
             if len(c) == 3:
                 c.append(255)
-            ptcls.append((c, cptcls))
-            while cvol > 0:
-                s = max(ir(rand(size)), 1)
-                if s * s > 2 * cvol:
-                    break
-                cvol -= s * s
-                plife = abs(rand(life))
-                if plife <= 0:
-                    continue
-                paccn = rand(accn)
-                pspeed = max(rand(speed), 0)
-                angle = uniform(0, 2 * pi)
-                cptcls.append([plife, paccn, pspeed, angle, [0, 0], (s, s),
-                               conf.PARTICLE_FADE_TIME * plife])
-                if paccn >= 0:
-                    xmax = pspeed * plife + .5 * paccn * plife * plife + s
-                elif -float(pspeed) / paccn < plife:
-                    xmax = -.5 * pspeed * pspeed / paccn + s
-                else:
-                    # decelerating but don't reach the maximum distance
-                    xmax = pspeed * plife + .5 * paccn * plife * plife + s
-                maxs.append((xmax * cos(angle), xmax * sin(angle)))
-        self.hs = hs = [int(ceil(max(0, *xmaxs))) for xmaxs in zip(*maxs)]
-        self.sfc = pg.Surface((hs[0] * 2, hs[0] * 2)).convert_alpha()
-        gm.Graphic.__init__(self, self.sfc, (pos[0] - hs[0], pos[1] - hs[0]),
-                            conf.LAYERS['particles'])
+            # each particle uses up its area of the volume; stop at the first
+            # one that would use more than twice what's left
+            s = np.maximum(np.round(rand(size, cvol)), 1).astype(int)
+            area = s * s
+            remain = cvol - (np.cumsum(area) - area)
+            stop = np.flatnonzero(area > 2 * remain)
+            if len(stop):
+                s = s[:stop[0]]
+            plife = np.abs(rand(life, len(s)))
+            s = s[plife > 0]
+            plife = plife[plife > 0]
+            n = len(s)
+            params.append((np.tile(c, (n, 1)), s, plife, rand(accn, n),
+                           np.maximum(rand(speed, n), 0),
+                           np.random.uniform(0, 2 * pi, n)))
+        c, s, plife, paccn, pspeed, angle = \
+            [np.concatenate(xs) for xs in zip(*params)]
+        # store everything per pixel, each particle being an s x s square
+        area = s * s
+        i = np.repeat(np.arange(len(s)), area)
+        k = np.arange(len(i)) - np.repeat(np.cumsum(area) - area, area)
+        n0 = self.n
+        self.n = n1 = n0 + len(i)
+        if n1 > len(self.ptcls['life']):
+            self._alloc(max(n1, 2 * len(self.ptcls['life'])))
+        ptcls = self.ptcls
+        new = {
+            'colour': c[i, :3], 'alpha': c[i, 3], 'life': plife[i],
+            'accn': paccn[i], 'speed': pspeed[i], 'cos': np.cos(angle)[i],
+            'sin': np.sin(angle)[i], 'dx': k % s[i], 'dy': k // s[i],
+            'fade_t': conf.PARTICLE_FADE_TIME * plife[i], 'x0': pos[0],
+            'y0': pos[1], 'vx': vel[0], 'vy': vel[1], 't0': self.t,
+            'burst': self._n_bursts, 'ptcl': self._n_ptcls + i
+        }
+        for name, v in new.iteritems():
+            ptcls[name][n0:n1] = v
+        self._n_bursts += 1
+        self._n_ptcls += len(s)
 
     def update (self, dt):
-        if not any(ptcls for c, ptcls in self.ptcls):
-            return True
         self.t += dt
-        t = self.t
         sfc = self.sfc
-        hs = self.hs
-        sfc.fill((0, 0, 0, 0))
-        for c, ptcls in self.ptcls:
-            i = 0
-            while i < len(ptcls):
-                ptcl = ptcls[i]
-                ptcl[0] -= dt
-                ptcl[2] += dt * ptcl[1]
-                t, accn, speed, angle, pos, size, fade_t = ptcl
-                pos[0] += dt * speed * cos(angle)
-                pos[1] += dt * speed * sin(angle)
-                alpha = c[3]
-                if t < fade_t:
-                    alpha = 255 - ir(alpha * (fade_t - max(t, 0)) / fade_t)
-                sfc.fill(c[:3] + [alpha],
-                         ((ir(pos[0]) + hs[0], ir(pos[1]) + hs[0]), size))
-                if t <= 0:
-                    ptcls.pop(i)
-                else:
-                    i += 1
-        self._mk_dirty()
+        # clear the last update's particles
+        dirty = self._drawn
+        for r in dirty:
+            sfc.fill((0, 0, 0, 0), r)
+        self._drawn = []
+        n = self.n
+        if n:
+            ptcls = dict((name, v[:n]) for name, v in self.ptcls.iteritems())
+            t = self.t - ptcls['t0']
+            # positions in closed form from the time since the burst
+            dist = ptcls['speed'] * t + .5 * ptcls['accn'] * t * t
+            x = np.round(ptcls['x0'] + ptcls['vx'] * t) + \
+                np.round(dist * ptcls['cos']) + ptcls['dx']
+            y = np.round(ptcls['y0'] + ptcls['vy'] * t) + \
+                np.round(dist * ptcls['sin']) + ptcls['dy']
+            x = x.astype(int)
+            y = y.astype(int)
+            remain = ptcls['life'] - t
+            fade_t = ptcls['fade_t']
+            alpha = ptcls['alpha']
+            alpha = np.where(remain < fade_t, 255 - np.round(
+                alpha * (fade_t - np.maximum(remain, 0)) / fade_t
+            ), alpha)
+            w, h = sfc.get_size()
+            shown = (x >= 0) & (x < w) & (y >= 0) & (y < h)
+            x = x[shown]
+            y = y[shown]
+            if len(x):
+                pixels = pg.surfarray.pixels3d(sfc)
+                pixels[x, y] = ptcls['colour'][shown]
+                del pixels
+                pixels = pg.surfarray.pixels_alpha(sfc)
+                pixels[x, y] = alpha[shown]
+                del pixels
+                # bounding box of each burst (pixels are ordered by burst)
+                burst = ptcls['burst'][shown]
+                starts = np.flatnonzero(np.concatenate((
+                    [True], burst[1:] != burst[:-1]
+                )))
+                x0 = np.minimum.reduceat(x, starts)
+                x1 = np.maximum.reduceat(x, starts) + 1
+                y0 = np.minimum.reduceat(y, starts)
+                y1 = np.maximum.reduceat(y, starts) + 1
+                self._drawn = [pg.Rect(r[0], r[1], r[2] - r[0], r[3] - r[1])
+                               for r in zip(x0, y0, x1, y1)]
+            # remove dead particles, keeping the rest in order
+            alive = remain > 0
+            m = np.count_nonzero(alive)
+            if m < n:
+                for v in self.ptcls.itervalues():
+                    v[:m] = v[:n][alive]
+                self.n = m
+        dirty = dirty + self._drawn
+        if dirty:
+            self._dirty += dirty
+
+    def cull (self, k):
+        # remove the oldest whole particles covering at least k pixels (a
+        # particle's pixels are together, and particles are ordered by age)
+        n = self.n
+        k = min(k, n)
+        if not k:
+            return
+        ptcl = self.ptcls['ptcl']
+        k += np.count_nonzero(ptcl[k:n] == ptcl[k - 1])
+        for v in self.ptcls.itervalues():
+            v[:n - k] = v[k:n]
+        self.n = n - k
 
-    def rand (self, data):
+    def rand (self, data, n):
         if data[1] == 0:
-            return data[0]
+            return np.repeat(float(data[0]), n)
         else:
-            return data[0] + randsgn() * expovariate(1. / data[1])
+            return data[0] + (2 * np.random.randint(0, 2, n) - 1) * \
+                   np.random.exponential(data[1], n)
 
 
 class Painter (gm.Graphic):
     def __init__ (self, world, ident, pos, axis, dirn, speed, imgs):
         self.world = world
         self.ident = ident
-        self._tpos_last = self.tpos = list(pos)
-        self._t_last = 0
+        self.tpos0 = list(pos)
+        # level time when fired
+        self.t0 = world.t
         self.axis = axis
         self.dirn = dirn
         self.remain = conf.PAINT_PER_PAINTER
         self.imgs = imgs
         self.speed = min(conf.BASE_PAINTER_SPEED + conf.PAINTER_SPEED * speed,
                          conf.MAX_PAINTER_SPEED)
+        # in tiles per second
+        self.vel = [0, 0]
+        self.vel[axis] = self.speed * dirn
+        # (level time, x, y) for each tile to paint, in order
+        self._crossings = self._find_crossings()
+        self._next_crossing = 0
         self.paint(*pos)
         gm.Graphic.__init__(self, imgs[ident].copy(), self.get_pos(0),
                             conf.LAYERS['painter'])
@@ -177,20 +355,54 @@ class Painter (gm.Graphic):
             sfc.blit(self.imgs[i], (0, 0))
             self.remain = conf.PAINTER_PAINT_PER_PICKUP
 
+    def _find_crossings (self):
+        # a tile is painted when the painter is half-way into it moving
+        # forwards, or as soon as it enters it moving backwards
+        i = self.axis
+        x0 = self.tpos0[i]
+        size = self.world.rect.size[i]
+        speed = float(self.speed)
+        pos = list(self.tpos0)
+        crossings = []
+        if self.dirn > 0:
+            # only canvas tiles can be painted
+            for x in xrange(max(x0 + 1, 1), size - 1):
+                pos[i] = x
+                crossings.append((self.t0 + (x - .5 - x0) / speed,
+                                  pos[0], pos[1]))
+        else:
+            for x in xrange(min(x0, size - 2), 0, -1):
+                pos[i] = x
+                crossings.append((self.t0 + (x0 - x) / speed, pos[0], pos[1]))
+        return crossings
+
+    def tpos_at (self, t):
+        # position in tiles at the given level time
+        return [x0 + v * (t - self.t0) for x0, v in zip(self.tpos0, self.vel)]
+
     def get_pos (self, t):
+        # position follows the level's clock rather than the interp's, so
+        # that it agrees with Level's collision predictions
         i = self.axis
-        p = self.tpos
-        p[i] += self.speed * (t - self._t_last) * self.dirn
-        if self._tpos_last[i] % 1 < .5 and p[i] % 1 >= .5:
-            self.paint(ir(p[0]), ir(p[1]))
-        self._tpos_last = list(p)
-        self._t_last = t
-        p = self.world.tile_pos(*p)
+        t = self.world.t
+        # paint every tile crossed since the last call
+        crossings = self._crossings
+        n = self._next_crossing
+        while n < len(crossings) and crossings[n][0] < t:
+            self.paint(*crossings[n][1:])
+            n += 1
+        self._next_crossing = n
+        p = self.world.tile_pos(*self.tpos_at(t))
         if p[i] < -self.world.tile_size or p[i] >= conf.RES[i]:
             return None
         else:
             return p
 
+    def draw_at (self, t):
+        # move the sprite to where it is at the given level time, without
+        # painting
+        self.pos = self.world.tile_pos(*self.tpos_at(t))
+
     def explode (self):
         self.world.scheduler.rm_timeout(self._pos_interp)
         self.world.rm_painter(self)
@@ -369,6 +581,8 @@ class Level (World):
         self.tile_size = ts = min((w - 2 * conf.METER_WIDTH - 2 * b) / sx,
                                   (h - 2 * conf.SCORE_HEIGHT - 2 * b) / sy)
         self.grid_offset = ((w - sx * ts) / 2, (h - sy * ts) / 2)
+        if conf.DIRTY_GRID:
+            self.graphics.set_dirty_grid(ts, self.grid_offset)
 
         self.canvas = Canvas(self)
         self.players = ps = []
@@ -389,7 +603,11 @@ class Level (World):
                 (keys_r, p.run, eh.MODE_HELD)
             ])
         self.painters = []
-        self.particles = []
+        # {painter: {other_painter: collision_timeout_id}}
+        self._collisions = {}
+        self.particles = Particles(self)
+        # pixels of particles allowed at once, adjusted by frame time
+        self.ptcl_budget = conf.PARTICLE_BUDGET[1]
         mw = conf.METER_WIDTH + 2 * b
         self.score = Meter(0, conf.PLAYER_COLOURS,
                            (mw, b, conf.RES[0] - 2 * mw, conf.SCORE_HEIGHT))
@@ -397,37 +615,52 @@ class Level (World):
 
         # graphics
         self.bg = bg = gm.Graphic('bg.png', (0, 0), conf.LAYERS['bg'])
-        self.graphics.add(bg, self.canvas, *ps)
+        self.graphics.add(bg, self.canvas, self.particles, *ps)
         self.painter_imgs = [conf.GAME.img('painter{0}.png'.format(i + 1),
                                            (ts, ts)) for i in xrange(2)]
         self.graphics.add(self.score)
 
+    @property
+    def t (self):
+        # time elapsed in the level, in seconds, on the same clock as
+        # timeouts, so that it's already up to date while handling events
+        return self.scheduler.elapsed
+
     def update (self):
+        # painters paint after the last draw
+        self.canvas.flush()
         for p in self.players:
             p.update()
-        # painter collisions
-        ps = self.painters
-        rm = []
-        for i, p1 in enumerate(ps):
-            if p1 in rm:
-                continue
-            for p2 in ps[i + 1:]:
-                if p2 in rm:
-                    continue
-                x1, y1 = p1.tpos
-                x2, y2 = p2.tpos
-                if abs(x2 - x1) < 1 and abs(y2 - y1) < 1:
-                    rm.extend((p1, p2))
-        for i in xrange(len(rm) / 2):
-            conf.GAME.play_snd('explode')
-        for p in rm:
-            p.explode()
-        frame = self.scheduler.frame
-        for p in self.particles[:]:
-            if p.update(frame):
-                self.particles.remove(p)
-                self.graphics.rm(p)
-                self.scheduler.rm_timeout(p.mover)
+        self._update_ptcl_budget()
+        self.particles.update(self.scheduler.frame)
+
+    def _update_ptcl_budget (self):
+        # shrink the particle budget when the last frame took too long, and
+        # grow it back when there's time to spare
+        s = self.scheduler
+        load = s.busy_time / s.frame
+        low, high = conf.PARTICLE_LOAD
+        grow, shrink = conf.PARTICLE_BUDGET_STEP
+        b = self.ptcl_budget
+        if load > high:
+            b /= shrink
+        elif load < low:
+            b *= grow
+        b0, b1 = conf.PARTICLE_BUDGET
+        self.ptcl_budget = b = min(max(b, b0), b1)
+        excess = self.particles.n - int(b)
+        if excess > 0:
+            self.particles.cull(excess)
+
+    def draw (self):
+        s = self.scheduler
+        if s.fixed_step:
+            # simulation steps and drawing aren't in sync, so draw painters
+            # the proportion alpha of the way between the last two steps
+            t = self.t - (1 - s.alpha) * s.frame
+            for p in self.painters:
+                p.draw_at(t)
+        return World.draw(self)
 
     def tile_pos (self, x, y):
         x0, y0 = self.grid_offset
@@ -444,23 +677,66 @@ class Level (World):
         return (x0 + x * s, y0 + y * s, w * s, h * s)
 
     def add_painter (self, p):
+        # painters move in straight lines at constant speeds, so we can find
+        # when they'll hit each other now and schedule it
+        collisions = self._collisions
+        collisions[p] = {}
+        for q in self.painters:
+            dt = self._collision_time(p, q)
+            if dt is not None:
+                i = self.scheduler.add_timeout(self._collide, p, q,
+                                               seconds = dt)
+                collisions[p][q] = collisions[q][p] = i
         self.painters.append(p)
         self.graphics.add(p)
 
     def rm_painter (self, p):
         self.graphics.rm(p)
         self.painters.remove(p)
+        collisions = self._collisions
+        for q, i in collisions.pop(p).iteritems():
+            self.scheduler.rm_timeout(i)
+            del collisions[q][p]
+
+    def _collision_time (self, p1, p2):
+        # time from now until two painters are first less than a tile apart
+        # in both axes, or None if they never will be
+        x1 = p1.tpos_at(self.t)
+        x2 = p2.tpos_at(self.t)
+        t0 = 0
+        t1 = float('inf')
+        for i in (0, 1):
+            d = x2[i] - x1[i]
+            v = float(p2.vel[i] - p1.vel[i])
+            if v == 0:
+                if abs(d) >= 1:
+                    return None
+            else:
+                ta = (-1 - d) / v
+                tb = (1 - d) / v
+                t0 = max(t0, min(ta, tb))
+                t1 = min(t1, max(ta, tb))
+        return t0 if t0 < t1 else None
+
+    def _collide (self, p1, p2):
+        # even if they've already passed through each other, since the last
+        # frame
+        conf.GAME.play_snd('explode')
+        p1.explode()
+        p2.explode()
 
     def add_ptcls (self, pos, ident, vel = (0, 0)):
-        p = Particles(pos, conf.PARTICLE_COLOURS[ident], *conf.BURST_PARTICLES)
-        pos = p.pos
-        get_pos = lambda t: (pos[0] + vel[0] * t, pos[1] + vel[1] * t)
-        p.mover = self.scheduler.interp(get_pos, (p, 'pos'), round_val = True)
-        self.particles.append(p)
-        self.graphics.add(p)
+        volume, size, speed, accn, life = conf.BURST_PARTICLES
+        # fewer particles per burst when the budget is reduced
+        volume *= float(self.ptcl_budget) / conf.PARTICLE_BUDGET[1]
+        self.particles.add(pos, vel, conf.PARTICLE_COLOURS[ident], volume,
+                           size, speed, accn, life)
 
 
 class PostGame (World):
+    # nothing moves; just wait for input
+    idle = True
+
     def __init__ (self, scheduler, evthandler, imgs, scores):
         self.args = (imgs, scores)
         World.__init__(self, scheduler, evthandler)
@@ -1,6 +1,10 @@
 from sys import argv
+from time import time
+import random
 import os
 
+import numpy as np
+
 if os.name == 'nt':
     # for Windows freeze support
     import pygame._view
@@ -10,8 +14,6 @@ from game import conf
 from game.level import Level as entry_world
 
 if __name__ == '__main__':
-    engine.init()
-
     if len(argv) > 1:
         # got some command-line arguments
         from optparse import OptionParser
@@ -20,6 +22,21 @@ if __name__ == '__main__':
         op.add_option('-p', '--profile', action = 'store_true')
         op.add_option('-t', '--time', action = 'store', type = 'float',
                       help = 'float seconds to run for')
+        op.add_option('-r', '--frames', action = 'store', type = 'int',
+                      help = 'number of frames to run for; ignored if ' \
+                      '--time is given')
+        op.add_option('-l', '--headless', action = 'store_true',
+                      help = 'run without a window or audio, as fast as ' \
+                      'possible, and report the frame rate at exit')
+        op.add_option('-e', '--seed', action = 'store', type = 'int',
+                      help = 'seed for random number generation')
+        op.add_option('-c', '--frame-stats', action = 'store',
+                      type = 'string', help = 'record how long each part of ' \
+                      'recent frames took and write it to this file as CSV ' \
+                      'at exit')
+        op.add_option('-j', '--jitter', action = 'store_true',
+                      help = 'report how consistently frames were paced at ' \
+                      'exit')
         op.add_option('-n', '--num-stats', action = 'store', type = 'int',
                       help = 'number of functions to show when profiling; ' \
                       'defaults to 30')
@@ -28,26 +45,54 @@ if __name__ == '__main__':
         op.add_option('-s', '--sort-stats', action = 'store', type = 'string',
                       help = 'profile stats sort mode; defaults to ' \
                       '\'cumulative\' (see pstats.Stats.sort_stats doc)')
-        op.set_defaults(debug = False, time = None, num_stats = 30,
+        op.set_defaults(debug = False, time = None, frames = None,
+                        headless = False, seed = None, frame_stats = None,
+                        jitter = False, num_stats = 30,
                         profile_file = '.profile_stats', sort_stats = 'cumulative')
         options = op.parse_args()[0]
         # debug
         engine.conf.DEBUG = options.debug
+        engine.conf.HEADLESS = options.headless
+        if options.frame_stats is not None:
+            engine.conf.FRAME_STATS = True
+            engine.conf.FRAME_STATS_FILE = options.frame_stats
+        if options.seed is not None:
+            random.seed(options.seed)
+            np.random.seed(options.seed)
+        engine.init()
         # construct world args
         args = ()
         # run game
+        t0 = time()
         if options.profile:
             from cProfile import run
             from pstats import Stats
             args = ', '.join(repr(arg) for arg in args)
-            code = 'engine.game.run(entry_world, {0}t = options.time)'
+            code = 'n_frames = engine.game.run(entry_world, {0}t = ' \
+                   'options.time, frames = options.frames)'
+            # runs in this module's namespace, so defines n_frames here
             run(code.format(args), options.profile_file, locals())
+            t = time() - t0
             Stats(options.profile_file).strip_dirs() \
                 .sort_stats(options.sort_stats).print_stats(options.num_stats)
             os.unlink(options.profile_file)
         else:
-            engine.game.run(entry_world, *args, t = options.time)
+            n_frames = engine.game.run(entry_world, *args, t = options.time,
+                                       frames = options.frames)
+            t = time() - t0
+        if options.headless:
+            print 'info: ran {0} frames in {1:.3f}s ({2:.1f} FPS)'.format(
+                n_frames, t, n_frames / t if t > 0 else 0
+            )
+        if options.jitter:
+            scheduler = engine.conf.GAME.world.scheduler
+            mean, sd, worst = scheduler.jitter()
+            print 'info: frame length error over the last {0} frames in ' \
+                  'ms: mean {1:.3f}, s.d. {2:.3f}, worst {3:.3f}'.format(
+                len(scheduler.intervals), 1000 * mean, 1000 * sd, 1000 * worst
+            )
     else:
+        engine.init()
         engine.game.run(entry_world)
 
     engine.quit()